@@ -0,0 +1,210 @@
+import os
+import numpy as np
+from constants import *
+
+# Features of taking an action at a node, all roughly within [0, 1]
+BIAS = 0
+PELLETDISTANCE = 1 # Maze distance to the closest pellet when leaving in the direction, over the maze size
+PELLETSONEDGE = 2 # Pellets on the edge towards the next node, per tile
+GHOSTCLOSENESS = 3 # 1 / (1 + tiles) to the closest scattering or chasing ghost
+GHOSTSNEAR = 4 # Share of the scattering or chasing ghosts within DANGERTILES
+FREIGHTCLOSENESS = 5 # 1 / (1 + tiles) to the closest frightened ghost
+FREIGHTSHARE = 6 # Share of the ghosts that are frightened
+REVERSING = 7 # Turning back the way Pacman came
+EXITS = 8 # Ways on from the next node, 0 for a dead end
+POWERCLOSENESS = 9 # 1 / (1 + tiles) to the closest power pellet
+NFEATURES = 10
+
+DANGERTILES = 5
+DIRECTIONS = [UP, DOWN, LEFT, RIGHT]
+
+class MazeDistances(object):
+    """
+    Shortest maze distances in pixels between all nodes of a NodeGroup, and where every pellet lies on the maze
+
+    Distances ignore access restrictions and take portals as free, ghosts use the same corridors.
+    """
+    def __init__(self, nodes, pellets):
+        self.nodes = nodes
+        nodeList = list(nodes.nodesLUT.values())
+        self.index = dict((id(node), i) for i, node in enumerate(nodeList))
+        n = len(nodeList)
+        self.distances = np.full((n, n), np.inf)
+        np.fill_diagonal(self.distances, 0)
+        edges = []
+        for i, node in enumerate(nodeList):
+            for direction in DIRECTIONS:
+                neighbor = node.neighbors[direction]
+                if neighbor is not None:
+                    j = self.index[id(neighbor)]
+                    self.distances[i, j] = (neighbor.position - node.position).magnitude()
+                    if direction in (DOWN, RIGHT):
+                        edges.append((i, j))
+            if node.neighbors[PORTAL] is not None:
+                self.distances[i, self.index[id(node.neighbors[PORTAL])]] = 0
+        for k in range(n):
+            self.distances = np.minimum(self.distances, self.distances[:, k, None] + self.distances[None, k, :])
+        finite = self.distances[np.isfinite(self.distances)]
+        self.scale = finite.max() if len(finite) else 1.0
+        self.placePellets(nodeList, edges, pellets.pelletList)
+
+    def placePellets(self, nodeList, edges, pelletList):
+        """
+        Finds the edge (u, v) every pellet lies on and its distances du and dv to both ends, keyed by pellet position
+        """
+        positions = np.array([(node.position.x, node.position.y) for node in nodeList])
+        edges = np.array(edges, dtype=np.int64).reshape(-1, 2)
+        low = np.minimum(positions[edges[:, 0]], positions[edges[:, 1]])
+        high = np.maximum(positions[edges[:, 0]], positions[edges[:, 1]])
+        self.pellets = {}
+        for pellet in pelletList:
+            p = np.array([pellet.position.x, pellet.position.y])
+            onEdge = np.all((low <= p) & (p <= high), axis=1)
+            if onEdge.any():
+                u, v = edges[onEdge.argmax()]
+            else:
+                u = v = np.argmin(((positions - p)**2).sum(axis=1)) # Off the maze, go by the closest node
+            du = np.abs(positions[u] - p).sum()
+            dv = np.abs(positions[v] - p).sum()
+            self.pellets[(pellet.position.x, pellet.position.y)] = (u, v, du, dv)
+
+    def pelletArrays(self, pelletList):
+        if len(pelletList) == 0:
+            return None
+        rows = np.array([self.pellets[(pellet.position.x, pellet.position.y)] for pellet in pelletList])
+        return rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64), rows[:, 2], rows[:, 3]
+
+
+class LinearState(object):
+    """
+    The features of every direction Pacman can leave its node in, one row per direction
+    """
+    def __init__(self, node, actions, features):
+        self.node = node
+        self.actions = actions
+        self.features = features
+
+    def row(self, action):
+        if action in self.actions:
+            return self.actions.index(action)
+        return None
+
+    def __eq__(self, other):
+        if not isinstance(other, LinearState):
+            return False
+        return self.node is other.node and self.actions == other.actions and np.array_equal(self.features, other.features)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+class LinearAgent(object):
+    """
+    Approximates Q(s, a) as weights . features(s, a) over a fixed number of maze features
+
+    Unlike the Q-table its size does not grow with the states seen, and the features mean the
+    same in every maze, so what is learned on one maze carries over to the other.
+    """
+    def __init__(self, alpha=0.01, gamma=0.95, rewardScale=0.01):
+        self.alpha = alpha
+        self.gamma = gamma
+        self.rewardScale = rewardScale # Brings the rewards, up to 500, into the range of the features
+        self.weights = np.zeros(NFEATURES)
+        self.maze = None
+
+    def observe(self, pacman):
+        """
+        Returns the LinearState of Pacman at its current node
+        """
+        if self.maze is None or self.maze.nodes is not pacman.nodes:
+            self.maze = MazeDistances(pacman.nodes, pacman.pellets)
+        maze = self.maze
+        node = pacman.node
+        actions = [direction for direction in DIRECTIONS if node.neighbors[direction] is not None and PACMAN in node.access[direction]]
+        features = np.zeros((len(actions), NFEATURES))
+        if len(actions) == 0:
+            return LinearState(node, actions, features)
+        i = maze.index[id(node)]
+        targets = np.array([maze.index[id(node.neighbors[action])] for action in actions])
+        lengths = maze.distances[i, targets]
+        fromTargets = maze.distances[targets] # (actions, nodes)
+        features[:, BIAS] = 1
+
+        pellets = maze.pelletArrays(pacman.pellets.pelletList)
+        if pellets is not None:
+            u, v, du, dv = pellets
+            distances = lengths[:, None] + np.minimum(fromTargets[:, u] + du, fromTargets[:, v] + dv)
+            # Pellets on the edge being taken are reached straight away
+            onEdge = ((u == i) & (v[None, :] == targets[:, None])) | ((v == i) & (u[None, :] == targets[:, None]))
+            distances = np.where(onEdge, np.where(u == i, du, dv), distances)
+            features[:, PELLETDISTANCE] = np.minimum(distances.min(axis=1) / maze.scale, 1.0)
+            features[:, PELLETSONEDGE] = onEdge.sum(axis=1) * TILEWIDTH / np.maximum(lengths, TILEWIDTH)
+        # powerpellets keeps the eaten ones too, only those still in tiles are left on the maze
+        tiles = pacman.pellets.tiles
+        powerpellets = maze.pelletArrays([pellet for pellet in pacman.pellets.powerpellets if pellet.position.asTuple() in tiles])
+        if powerpellets is not None:
+            u, v, du, dv = powerpellets
+            distances = lengths[:, None] + np.minimum(fromTargets[:, u] + du, fromTargets[:, v] + dv)
+            features[:, POWERCLOSENESS] = 1.0 / (1 + distances.min(axis=1) / TILEWIDTH)
+
+        ghosts = pacman.ghost_group.ghosts
+        ghostNodes = np.array([maze.index[id(ghost.node)] for ghost in ghosts])
+        ghostTargets = np.array([maze.index[id(ghost.target)] for ghost in ghosts])
+        ghostTiles = (lengths[:, None] + np.minimum(fromTargets[:, ghostNodes], fromTargets[:, ghostTargets])) / TILEWIDTH
+        modes = np.array([ghost.mode.current for ghost in ghosts])
+        dangerous = (modes == SCATTER) | (modes == CHASE)
+        frightened = modes == FREIGHT
+        if dangerous.any():
+            features[:, GHOSTCLOSENESS] = 1.0 / (1 + ghostTiles[:, dangerous].min(axis=1))
+            features[:, GHOSTSNEAR] = (ghostTiles[:, dangerous] <= DANGERTILES).sum(axis=1) / float(len(ghosts))
+        if frightened.any():
+            features[:, FREIGHTCLOSENESS] = 1.0 / (1 + ghostTiles[:, frightened].min(axis=1))
+        features[:, FREIGHTSHARE] = frightened.mean()
+
+        features[:, REVERSING] = [action == pacman.direction * -1 for action in actions]
+        features[:, EXITS] = [(sum(1 for direction in DIRECTIONS if node.neighbors[action].neighbors[direction] is not None) - 1) / 3.0
+                              for action in actions]
+        return LinearState(node, actions, features)
+
+    def values(self, state):
+        return state.features @ self.weights
+
+    def bestAction(self, state, available_actions, rng):
+        """
+        Returns the available action with the highest Q-value, ties broken at random
+        """
+        q_values = self.values(state)
+        candidates = [(q_values[state.row(action)], action) for action in available_actions if state.row(action) is not None]
+        if len(candidates) == 0:
+            return available_actions[rng.integers(len(available_actions))]
+        best = max(q for q, action in candidates)
+        actions = [action for q, action in candidates if q == best]
+        return actions[rng.integers(len(actions))]
+
+    def learn(self, state, action, reward, nextState, nextActions):
+        """
+        Semi-gradient Q-learning step on the weights, curr_state 0 marks a terminal transition
+        """
+        row = state.row(action)
+        if row is None:
+            return # Pacman stood still, there is no feature row for it
+        features = state.features[row]
+        future = 0.0
+        if nextState:
+            rows = [nextState.row(a) for a in nextActions if nextState.row(a) is not None]
+            if len(rows) > 0:
+                future = self.values(nextState)[rows].max()
+        error = reward * self.rewardScale + self.gamma * future - features @ self.weights
+        self.weights += self.alpha * error * features
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            np.save(f, self.weights)
+
+    def load(self, filename):
+        """
+        Loads the weights from filename, a missing file starts from zero weights
+        """
+        if os.path.exists(filename):
+            with open(filename, "rb") as f:
+                self.weights = np.load(f)
@@ -0,0 +1,196 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import sys
+import json
+import math
+import argparse
+import platform
+import subprocess
+import numpy as np
+from benchmarks.bench import addBenchmarkArgs, runBenchmarks
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def machineFingerprint():
+    """
+    Returns what identifies the machine and software a benchmark ran on
+    """
+    versions = {"numpy": np.__version__}
+    try:
+        import pygame
+        versions["pygame"] = pygame.version.ver
+    except ImportError:
+        versions["pygame"] = None
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "packages": versions,
+    }
+
+def gitRevision():
+    """
+    Returns the current git commit and whether the tree has uncommitted changes, or None outside of git
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=here, stderr=subprocess.DEVNULL).decode().strip()
+        status = subprocess.check_output(["git", "status", "--porcelain"], cwd=here, stderr=subprocess.DEVNULL).decode()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {"commit": commit, "dirty": len(status.strip()) > 0}
+
+def baselinePath(name, directory=RESULTS_DIR):
+    return os.path.join(directory, name + ".json")
+
+def saveBaseline(name, results, directory=RESULTS_DIR):
+    results = dict(results)
+    results["name"] = name
+    results["fingerprint"] = machineFingerprint()
+    results["git"] = gitRevision()
+    os.makedirs(directory, exist_ok=True)
+    with open(baselinePath(name, directory), "w") as f:
+        json.dump(results, f, indent=2)
+    return results
+
+def loadBaseline(name, directory=RESULTS_DIR):
+    with open(baselinePath(name, directory)) as f:
+        return json.load(f)
+
+def rankSamples(values):
+    """
+    Returns the ranks of values starting at 1, tied values get the average of their ranks, and the tie sizes
+    """
+    unique, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    starts = np.cumsum(counts) - counts
+    return (starts + (counts + 1) / 2.0)[inverse], counts
+
+def mannWhitneyGreater(a, b):
+    """
+    Returns the one-sided p-value of the Mann-Whitney U test that samples in b tend to be larger than samples in a
+
+    Uses the normal approximation with tie and continuity correction
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    n1, n2 = len(a), len(b)
+    n = n1 + n2
+    ranks, ties = rankSamples(np.concatenate([a, b]))
+    u = ranks[n1:].sum() - n2 * (n2 + 1) / 2.0
+    mean = n1 * n2 / 2.0
+    variance = n1 * n2 / 12.0 * ((n + 1) - (ties**3 - ties).sum() / float(n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def compareResults(base, new, alpha=0.05, threshold=0.05):
+    """
+    Compares every benchmark present in both results and returns one report row per benchmark
+
+    A benchmark regressed when its median got worse by more than threshold and the samples are
+    significantly worse according to a one-sided Mann-Whitney U test at level alpha
+    """
+    rows = []
+    for name, baseBench in base["benchmarks"].items():
+        if name not in new["benchmarks"]:
+            continue
+        newBench = new["benchmarks"][name]
+        higherIsBetter = baseBench["higherIsBetter"]
+        baseMedian = baseBench["stats"]["p50"]
+        newMedian = newBench["stats"]["p50"]
+        change = newMedian / baseMedian - 1 if baseMedian != 0 else 0.0
+        if higherIsBetter:
+            worse = -change
+            p = mannWhitneyGreater(newBench["samples"], baseBench["samples"])
+        else:
+            worse = change
+            p = mannWhitneyGreater(baseBench["samples"], newBench["samples"])
+        rows.append({
+            "name": name,
+            "unit": baseBench["unit"],
+            "base": baseMedian,
+            "new": newMedian,
+            "change": change,
+            "p": p,
+            "regression": worse > threshold and p < alpha,
+            "improvement": -worse > threshold and p > 1 - alpha,
+        })
+    return rows
+
+def printReport(rows, base, new, out=sys.stdout):
+    if base.get("fingerprint") != new.get("fingerprint"):
+        print("WARNING: the results come from different machines or software versions", file=out)
+    print("%-40s %14s %14s %9s %8s" % ("benchmark", "base p50", "new p50", "change", "p"), file=out)
+    for row in rows:
+        flag = ""
+        if row["regression"]:
+            flag = "  REGRESSION"
+        elif row["improvement"]:
+            flag = "  improved"
+        print("%-40s %14.6g %14.6g %+8.1f%% %8.3f%s" % (row["name"], row["base"], row["new"], row["change"]*100, row["p"], flag), file=out)
+
+def benchmarkArgsFromMeta(meta, args):
+    """
+    Uses the seed, scale and benchmark selection of a baseline, so a comparison run measures the same scenarios
+    """
+    args.seed = meta["seed"]
+    args.scale = meta["scale"]
+    args.large = meta.get("large", False)
+    args.only = meta.get("only")
+    return args
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Records named benchmark baselines and compares runs against them. Run from the Pacman_Complete directory.")
+    parser.add_argument("--dir", default=RESULTS_DIR, help="directory the baselines are stored in")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    save = commands.add_parser("save", help="run the benchmarks and store the results as a named baseline")
+    save.add_argument("name")
+    addBenchmarkArgs(save)
+
+    compare = commands.add_parser("compare", help="compare a new run, or another baseline, against a baseline")
+    compare.add_argument("base")
+    compare.add_argument("new", nargs="?", help="baseline to compare, a new run with the base's settings if left out")
+    compare.add_argument("--save", help="also store the new run as a baseline with this name")
+    compare.add_argument("--alpha", type=float, default=0.05, help="significance level of the test")
+    compare.add_argument("--threshold", type=float, default=0.05, help="smallest relative slowdown reported")
+    compare.add_argument("--display", action="store_true", help="render to a real window instead of the dummy video driver")
+
+    commands.add_parser("list", help="list the stored baselines")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parseArgs(argv)
+    if args.command == "save":
+        results = saveBaseline(args.name, runBenchmarks(args), args.dir)
+        print("saved baseline", args.name, "at", (results["git"] or {}).get("commit"))
+    elif args.command == "compare":
+        base = loadBaseline(args.base, args.dir)
+        if args.new is not None:
+            new = loadBaseline(args.new, args.dir)
+        else:
+            new = runBenchmarks(benchmarkArgsFromMeta(base["meta"], args))
+            new["fingerprint"] = machineFingerprint()
+            if args.save:
+                saveBaseline(args.save, new, args.dir)
+        rows = compareResults(base, new, args.alpha, args.threshold)
+        printReport(rows, base, new)
+        if any(row["regression"] for row in rows):
+            return 1
+    elif args.command == "list":
+        if os.path.isdir(args.dir):
+            for filename in sorted(os.listdir(args.dir)):
+                if filename.endswith(".json"):
+                    baseline = loadBaseline(filename[:-5], args.dir)
+                    git = baseline.get("git") or {}
+                    print(baseline["name"], baseline["meta"]["time"], git.get("commit"), "dirty" if git.get("dirty") else "")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
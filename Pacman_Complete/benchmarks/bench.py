@@ -0,0 +1,69 @@
+import os
+# Must be set before pygame is imported, so nothing but the results ends up on stdout
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+
+def addBenchmarkArgs(parser):
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the number of iterations of every benchmark")
+    parser.add_argument("--only", nargs="+", help="only run benchmarks whose name starts with one of these")
+    parser.add_argument("--large", action="store_true", help="also run the 1M entry Q-table scenarios")
+    parser.add_argument("--display", action="store_true", help="render to a real window instead of the dummy video driver")
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the benchmarks and prints the results as JSON. Run from the Pacman_Complete directory.")
+    addBenchmarkArgs(parser)
+    parser.add_argument("--output", help="write the results to this file instead of stdout")
+    return parser.parse_args(argv)
+
+def runBenchmarks(args):
+    """
+    Runs the selected benchmarks and returns the results as a JSON serializable dict
+    """
+    if not args.display:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    from benchmarks.scenarios import getBenchmarks
+    from benchmarks.timing import summarize
+
+    results = {
+        "meta": {
+            "seed": args.seed,
+            "scale": args.scale,
+            "large": args.large,
+            "only": args.only,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "benchmarks": {},
+    }
+    for name, unit, higherIsBetter, func in getBenchmarks(args.large):
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            continue
+        print("running", name, file=sys.stderr)
+        # The game prints progress messages, keep them out of the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            samples = func(args.seed, args.scale)
+        stats = summarize(samples)
+        print("  p50 %.6g %s" % (stats["p50"], unit), file=sys.stderr)
+        results["benchmarks"][name] = {"unit": unit, "higherIsBetter": higherIsBetter, "stats": stats, "samples": samples}
+    return results
+
+def writeResults(results, path=None):
+    if path is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    args = parseArgs()
+    writeResults(runBenchmarks(args), args.output)
@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+import pickle
+import tempfile
+import subprocess
+import numpy as np
+from functools import partial
+from constants import *
+from run import GameController
+from nodes import NodeGroup
+from mazedata import MazeData
+from states import encodeState
+from ghostengine import GhostEngine
+from benchmarks.timing import timeCalls
+
+QTABLE_SIZES = [1000, 10000, 100000]
+LARGE_QTABLE_SIZES = [1000000]
+MAX_EPISODE_FRAMES = 100000
+GHOSTENGINE_GAMES = [1, 256]
+
+def makeGame(seed, speedModifier=3):
+    """
+    Returns a started and unpaused game that simulates with a fixed timestep and never renders
+    """
+    game = GameController(seed)
+    game.speedModifier = speedModifier
+    game.setLearning(False)
+    game.setEpisodes(10**9) # Never run out of episodes, restartGame would exit
+    game.setFixedTimestep(1.0 / 30)
+    game.setRenderInterval(0)
+    game.startGame()
+    game.pause.paused = False
+    return game
+
+def syntheticQTable(game, size, seed):
+    """
+    Returns a Q-table with size entries over states built from the maze's nodes, and the states in it
+    """
+    rng = np.random.default_rng(seed)
+    nodes = len(game.nodes.nodeList)
+    modes = [(SCATTER,)*4, (CHASE,)*4, (FREIGHT,)*4]
+    table = {}
+    states = []
+    while len(table) < size:
+        picks = rng.integers(nodes, size=5).tolist()
+        state = encodeState(game.pacman.mazeIndex, picks[0], int(rng.integers(NROWS * NCOLS)), picks[1:],
+                            modes[rng.integers(len(modes))])
+        states.append(state)
+        for action in [UP, DOWN, LEFT, RIGHT]:
+            table[(state, action)] = float(rng.normal())
+    return table, states
+
+def simulationThroughput(seed, scale):
+    game = makeGame(seed)
+    frames = max(1, int(1000 * scale))
+    samples = []
+    for i in range(5):
+        start = time.perf_counter()
+        for j in range(frames):
+            game.update()
+        samples.append(frames / (time.perf_counter() - start))
+    return samples
+
+def ghostEngineThroughput(seed, scale, games):
+    """
+    Ghost updates per second, ghosts of every game counted, of a GhostEngine of games copies of a game's ghosts
+    """
+    game = makeGame(seed)
+    engine = GhostEngine.fromGhostGroup(game.ghosts, game.nodes, games, np.random.default_rng(seed))
+    engine.startFreight(np.arange(0, games, 2)) # Half the games move at random, half by goal
+    pacmanPosition = np.tile(game.pacman.position.asTuple(), (games, 1))
+    pacmanDirection = np.full(games, LEFT)
+    frames = max(1, int(20000 * scale / games))
+    samples = []
+    for i in range(5):
+        start = time.perf_counter()
+        for j in range(frames):
+            engine.update(1.0 / 30, pacmanPosition, pacmanDirection)
+        samples.append(frames * games * len(engine.startNode) / (time.perf_counter() - start))
+    return samples
+
+def getNewStateLatency(seed, scale):
+    game = makeGame(seed)
+    samples = []
+    for i in range(max(1, int(1000 * scale))):
+        game.update()
+        samples.extend(timeCalls(game.pacman.getNewState, 1))
+    return samples
+
+def chooseActionLatency(seed, scale, size):
+    game = makeGame(seed)
+    pacman = game.pacman
+    pacman.q_table, states = syntheticQTable(game, size, seed)
+    pacman.set_epsilon(0.0) # Always take the greedy path, which is the one reading the table
+    rng = np.random.default_rng(seed)
+    actions = [UP, DOWN, LEFT, RIGHT]
+    samples = []
+    for i in range(max(1, int(2000 * scale))):
+        state = states[rng.integers(len(states))]
+        samples.extend(timeCalls(pacman.choose_action, 1, state, actions))
+    return samples
+
+def learnLatency(seed, scale, size):
+    game = makeGame(seed)
+    pacman = game.pacman
+    pacman.q_table, states = syntheticQTable(game, size, seed)
+    rng = np.random.default_rng(seed)
+    samples = []
+    for i in range(max(1, int(2000 * scale))):
+        prev_state = states[rng.integers(len(states))]
+        curr_state = states[rng.integers(len(states))]
+        pacman.reward = -10
+        samples.extend(timeCalls(pacman.learn, 1, prev_state, LEFT, curr_state))
+    return samples
+
+def maze1Episode(seed, scale):
+    """
+    Times full episodes on maze1 from the same seed, an episode ends when the game restarts or the level is cleared
+    """
+    samples = []
+    for i in range(max(1, int(5 * scale))):
+        game = makeGame(seed)
+        episodes = game.episodes
+        start = time.perf_counter()
+        for frame in range(MAX_EPISODE_FRAMES):
+            game.update()
+            if game.episodes != episodes or game.level != 0:
+                break
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def qTableLoadLatency(seed, scale, size):
+    game = makeGame(seed)
+    table, states = syntheticQTable(game, size, seed)
+    fd, path = tempfile.mkstemp(suffix=".pkl")
+    os.close(fd)
+    try:
+        with open(path, "wb") as f:
+            pickle.dump(table, f)
+        del table, states
+        return timeCalls(game.pacman.load_policy, max(1, int(5 * scale)), path)
+    finally:
+        os.remove(path)
+
+def startGameLatency(seed, scale):
+    game = makeGame(seed)
+    return timeCalls(game.startGame, max(1, int(20 * scale)))
+
+def nextLevelLatency(seed, scale):
+    game = makeGame(seed)
+    return timeCalls(game.nextLevel, max(1, int(20 * scale)))
+
+def headlessStartup(seed, scale):
+    """
+    Times new processes importing the game and making a headless GameController, as a training worker starts
+    """
+    code = "from run import GameController; GameController(%d, headless=True)" % seed
+    samples = []
+    for i in range(max(1, int(10 * scale))):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def nodeGroupConstruction(seed, scale):
+    mazedata = MazeData()
+    samples = []
+    for i in range(max(1, int(50 * scale))):
+        mazedata.loadMaze(i)
+        start = time.perf_counter()
+        nodes = NodeGroup(mazedata.obj.name+".txt")
+        mazedata.obj.setPortalPairs(nodes)
+        mazedata.obj.connectHomeNodes(nodes)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def renderFPS(seed, scale):
+    game = makeGame(seed)
+    frames = max(1, int(100 * scale))
+    samples = []
+    for i in range(5):
+        game.update()
+        start = time.perf_counter()
+        for j in range(frames):
+            game.render()
+        samples.append(frames / (time.perf_counter() - start))
+    return samples
+
+def getBenchmarks(large=False):
+    """
+    Returns (name, unit, higherIsBetter, func) for every benchmark, func takes a seed and an iteration scale
+    """
+    benchmarks = [
+        ("simulation_steps_per_second", "steps/s", True, simulationThroughput),
+        ("getNewState_latency", "s", False, getNewStateLatency),
+    ]
+    for games in GHOSTENGINE_GAMES:
+        benchmarks.append(("ghost_engine_updates_per_second[games=%d]" % games, "ghosts/s", True, partial(ghostEngineThroughput, games=games)))
+    sizes = QTABLE_SIZES + (LARGE_QTABLE_SIZES if large else [])
+    for size in sizes:
+        benchmarks.append(("choose_action_latency[q=%d]" % size, "s", False, partial(chooseActionLatency, size=size)))
+    for size in sizes:
+        benchmarks.append(("learn_latency[q=%d]" % size, "s", False, partial(learnLatency, size=size)))
+    benchmarks.append(("maze1_episode_time", "s", False, maze1Episode))
+    for size in [size for size in sizes if size >= 100000]:
+        benchmarks.append(("qtable_load_latency[q=%d]" % size, "s", False, partial(qTableLoadLatency, size=size)))
+    benchmarks += [
+        ("startGame_latency", "s", False, startGameLatency),
+        ("nextLevel_latency", "s", False, nextLevelLatency),
+        ("headless_startup_time", "s", False, headlessStartup),
+        ("NodeGroup_construction", "s", False, nodeGroupConstruction),
+        ("render_fps", "frames/s", True, renderFPS),
+    ]
+    return benchmarks
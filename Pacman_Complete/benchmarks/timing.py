@@ -0,0 +1,30 @@
+import time
+import numpy as np
+
+def timeCalls(func, calls, *args):
+    """
+    Calls func the given number of times and returns the duration of each call in seconds
+    """
+    samples = []
+    for i in range(calls):
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def summarize(samples):
+    """
+    Returns summary statistics of a list of samples
+    """
+    values = np.asarray(samples, dtype=float)
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "stdev": float(values.std(ddof=1)) if values.size > 1 else 0.0,
+        "min": float(values.min()),
+        "p5": float(np.percentile(values, 5)),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
@@ -0,0 +1,59 @@
+import numpy as np
+
+class DynaPlanner(object):
+    """
+    Dyna-Q planning: remembers the last observed outcome of every (state, action) and replays them as extra Q-updates
+
+    The model maps (state, action) to (reward, next state, actions available in the next state).
+    Pairs also sit in a list, so a random pair is drawn in constant time. When the model holds
+    capacity pairs, a new pair replaces a random one.
+    """
+    def __init__(self, stepsPerUpdate=10, episodeSteps=10000, capacity=200000, rng=None):
+        if rng is None:
+            rng = np.random.default_rng()
+        self.stepsPerUpdate = stepsPerUpdate # Planning updates after every real update
+        self.episodeSteps = episodeSteps # Planning updates between episodes
+        self.capacity = capacity
+        self.rng = rng
+        self.model = {}
+        self.keys = []
+        self.index = {} # Position of each pair in keys
+        self.updates = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def observe(self, state, action, reward, nextState, nextActions):
+        key = (state, action)
+        if key not in self.model:
+            if len(self.keys) >= self.capacity:
+                self.forget(self.keys[self.rng.integers(len(self.keys))])
+            self.index[key] = len(self.keys)
+            self.keys.append(key)
+        self.model[key] = (reward, nextState, tuple(nextActions))
+
+    def forget(self, key):
+        i = self.index.pop(key)
+        last = self.keys.pop()
+        if last != key:
+            self.keys[i] = last
+            self.index[last] = i
+        del self.model[key]
+
+    def plan(self, q_table, alpha, gamma, steps):
+        """
+        Applies steps one-step Q-updates to q_table from pairs drawn from the model
+        """
+        if len(self.keys) == 0:
+            return
+        keys = self.keys
+        model = self.model
+        for i in self.rng.integers(len(keys), size=steps).tolist():
+            key = keys[i]
+            reward, nextState, nextActions = model[key]
+            future = 0
+            if nextState and len(nextActions) > 0:
+                future = max(q_table.get((nextState, action), 0) for action in nextActions)
+            current = q_table.get(key, 0)
+            q_table[key] = current + alpha * (reward + gamma * future - current)
+        self.updates += steps
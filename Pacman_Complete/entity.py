@@ -1,11 +1,21 @@
-import pygame
-from pygame.locals import *
 from vector import Vector2
 from constants import *
-from random import randint
+import numpy as np
+
+def closestOnSegment(point, start, end):
+    """
+    Returns how far along the segment from start to end, from 0 to 1, its point closest to point is
+    """
+    segment = end - start
+    length = segment.magnitudeSquared()
+    if length == 0:
+        return 0
+    d = point - start
+    return min(max((d.x * segment.x + d.y * segment.y) / length, 0), 1)
+
 
 class Entity(object):
-    def __init__(self, node):
+    def __init__(self, node, rng=None):
         self.name = None
         self.directions = {UP:Vector2(0, -1),DOWN:Vector2(0, 1), 
                           LEFT:Vector2(-1, 0), RIGHT:Vector2(1, 0), STOP:Vector2()}
@@ -21,15 +31,21 @@ class Entity(object):
         self.directionMethod = self.randomDirection
         self.setStartNode(node)
         self.image = None
+        self.sprites = None # Animates image, only given to entities of games that render
+        self.rng = rng if rng is not None else np.random.default_rng() # Random number generator for randomDirection
 
     def setPosition(self):
         self.position = self.node.position.copy()
+        self.swept = (self.position, self.position) # Start and end of the last move, see sweptCollide
 
     def update(self, dt):
+        start = self.position
         self.position += self.directions[self.direction]*self.speed*dt
+        end = self.position
          
         if self.overshotTarget():
             self.node = self.target
+            end = self.node.position # Before any portal, the move ends where the entity reached the node
             directions = self.validDirections()
             direction = self.directionMethod(directions)
             if not self.disablePortal:
@@ -42,6 +58,7 @@ class Entity(object):
                 self.target = self.getNewTarget(self.direction)
 
             self.setPosition()
+        self.swept = (start, end)
           
     def validDirection(self, direction):
         if direction is not STOP:
@@ -50,6 +67,24 @@ class Entity(object):
                     return True
         return False
 
+    def sweptCollide(self, other):
+        """
+        Returns whether self and other came within their collide radii at any time during their last moves
+
+        The moves are taken to have lasted equally long, so this is the distance check of
+        collideCheck made along the whole move instead of only at its end, and entities that
+        pass through each other within one frame still collide.
+        """
+        start, end = self.swept
+        otherStart, otherEnd = other.swept
+        # Where other is relative to self at the start and end of the moves, closest to 0 along the way
+        d0 = otherStart - start
+        d1 = otherEnd - end
+        zero = Vector2()
+        t = closestOnSegment(zero, d0, d1)
+        d = d0 + (d1 - d0) * t
+        return d.magnitudeSquared() <= (self.collideRadius + other.collideRadius)**2
+
     def getNewTarget(self, direction):
         if self.validDirection(direction):
             return self.node.neighbors[direction]
@@ -77,17 +112,10 @@ class Entity(object):
         return False
 
     def validDirections(self):
-        directions = []
-        for key in [UP, DOWN, LEFT, RIGHT]:
-            if self.validDirection(key):
-                if key != self.direction * -1:
-                    directions.append(key)
-        if len(directions) == 0:
-            directions.append(self.direction * -1)
-        return directions
+        return self.node.validDirections(self.name, self.direction)
 
     def randomDirection(self, directions):
-        return directions[randint(0, len(directions)-1)]
+        return directions[self.rng.integers(len(directions))]
 
     def goalDirection(self, directions):
         distances = []
@@ -107,17 +135,19 @@ class Entity(object):
         if self.node.neighbors[direction] is not None:
             self.target = self.node.neighbors[direction]
             self.position = (self.node.position + self.target.position) / 2.0
+            self.swept = (self.position, self.position)
 
     def reset(self):
         self.setStartNode(self.startNode)
         self.direction = STOP
-        self.speed = 100 * self.speedModifier
+        self.setSpeed(100)
         self.visible = True
 
     def setSpeed(self, speed):
         self.speed = (speed * TILEWIDTH / 16) * self.speedModifier
 
     def render(self, screen):
+        import pygame
         if self.visible:
             if self.image is not None:
                 adjust = Vector2(TILEWIDTH, TILEHEIGHT) / 2
@@ -0,0 +1,146 @@
+import math
+from constants import *
+
+class EventClock(object):
+    """
+    Picks the length of each frame so the frame ends at the next event, instead of after a fixed dt
+
+    Entities move in straight lines between nodes at constant speed, so the time until every
+    event can be worked out: an entity reaching its target node, Pacman touching a ghost, the
+    fruit or a pellet that matters on his way, a ghost changing mode, the fruit expiring or a
+    pause ending. Nothing else changes the game between events, so jumping from one to the next
+    plays the game a very small fixed dt would, in a fraction of the frames. Collisions are
+    still found by the usual checks: a frame ends where the contact starts and the next frame's
+    checks see it.
+
+    Pellets are too close together to give each its own frame, Pacman.sweepPellets eats the
+    ones he passed instead. Only the game logic is scheduled, animations and flashing are drawn
+    at whatever dt comes out, so this is meant for headless training.
+    """
+    def __init__(self, maxStep=0.5, minStep=1e-4):
+        self.maxStep = maxStep # Longest frame, when no event is due sooner
+        self.minStep = minStep # Shortest frame, so contacts that are already touching still advance time
+        self.pelletCounts = (30, 50, 70, 140) # Pellets eaten when checkPelletEvents and checkFruitEvents act
+        self.overshoot = 1e-6 # Added to event times so entities end up past an event, not short of it by rounding
+        self.steps = 0
+        self.time = 0
+
+    def nextStep(self, game):
+        # Decisions, made when an entity reaches a node or a game timer runs out, look at the other
+        # entities as they were at the start of the frame, and pellets passed in the frame are only
+        # eaten in the next one. So frames stop just short of a decision, and a frame of minStep
+        # crosses it, like a small fixed dt would.
+        decision = self.maxStep
+        dt = self.maxStep
+        pause = game.pause
+        remaining = pause.remaining()
+        if remaining is not None:
+            dt = min(dt, remaining)
+        if not pause.paused:
+            pacman = game.pacman
+            decision = min(decision, self.arrival(pacman))
+            # Ghost modes switching and the fruit expiring, game.timers only flash things and end pauses
+            timer = game.gameTimers.timeToNext()
+            if timer is not None:
+                decision = min(decision, timer)
+            for ghost in game.ghosts:
+                decision = min(decision, self.arrival(ghost))
+                if pacman.alive and ghost.mode.current is not SPAWN:
+                    dt = min(dt, self.contact(pacman, ghost))
+            if game.fruit is not None and pacman.alive:
+                dt = min(dt, self.contact(pacman, game.fruit))
+            if pacman.alive:
+                dt = min(dt, self.pelletTime(pacman, game.pellets))
+        if decision > 2 * self.minStep:
+            decision -= self.minStep
+        dt = max(min(dt, decision) + self.overshoot, self.minStep)
+        self.steps += 1
+        self.time += dt
+        return dt
+
+    def moving(self, entity):
+        return entity.target is not entity.node and entity.direction != STOP and entity.speed > 0
+
+    def arrival(self, entity):
+        """
+        Returns the time until entity passes its target node
+
+        An entity stopped at a node picks a direction in its next update, unless it is shut in,
+        until access changes at some other event.
+        """
+        if not self.moving(entity):
+            if any(direction != STOP for direction in entity.validDirections()):
+                return 0
+            return self.maxStep
+        edge = (entity.target.position - entity.node.position).magnitude()
+        travelled = (entity.position - entity.node.position).magnitude()
+        return max(edge - travelled, 0) / entity.speed
+
+    def velocity(self, entity):
+        if not self.moving(entity):
+            return entity.directions[STOP]
+        return entity.directions[entity.direction] * entity.speed
+
+    def contact(self, pacman, other):
+        """
+        Returns the time until pacman and other come within their collide radii
+
+        The collision checks run after the ghosts have moved but before Pacman has, so over a
+        long frame a ghost could reach where Pacman started the frame and be caught there
+        without ever touching him. Frames stop short of that, as well as at the real contact.
+        """
+        d = other.position - pacman.position
+        r = pacman.collideRadius + other.collideRadius
+        touch = self.meet(d, self.velocity(other) - self.velocity(pacman), r)
+        lagging = self.meet(d, self.velocity(other), r)
+        if lagging < touch:
+            return max(lagging - self.minStep, 0)
+        return touch
+
+    def meet(self, d, v, r):
+        """
+        Returns the first t >= 0 with |d + v t| <= r, the time until something at offset d, moving at velocity v, comes within r
+        """
+        c = d.magnitudeSquared() - r * r
+        if c <= 0:
+            return 0
+        a = v.magnitudeSquared()
+        b = 2 * (d.x * v.x + d.y * v.y)
+        if a == 0 or b >= 0:
+            return self.maxStep # Not moving closer
+        discriminant = b * b - 4 * a * c
+        if discriminant < 0:
+            return self.maxStep # Passing by
+        return (-b - math.sqrt(discriminant)) / (2 * a)
+
+    def pelletTime(self, pacman, pellets):
+        """
+        Returns the time until pacman reaches the next pellet on his way to his target node that changes the game
+
+        Those are power pellets, the last pellet and the pellets whose count opens the ghost
+        house or brings the fruit, the others are eaten along the way by Pacman.sweepPellets.
+        Pellets lie on the tiles of the path Pacman moves along, so only the tiles ahead of him
+        on that line, up to his target, are looked up.
+        """
+        if not self.moving(pacman):
+            return self.maxStep
+        step = pacman.directions[pacman.direction]
+        reach = pacman.collideRadius + 2 * TILEWIDTH / 16 # Pellet collide radius
+        position = pacman.position
+        ahead = (pacman.target.position - position).magnitude() + reach
+        horizontal = step.x != 0
+        sign = int(step.x + step.y)
+        size = TILEWIDTH if horizontal else TILEHEIGHT
+        along = position.x if horizontal else position.y
+        # First tile within reach, counting from behind Pacman in his direction of travel
+        tile = math.ceil((along - reach) / size) if sign > 0 else math.floor((along + reach) / size)
+        count = pellets.numEaten
+        last = pellets.numEaten + len(pellets.pelletList)
+        while (tile * size - along) * sign <= ahead:
+            pellet = pellets.tiles.get((tile * size, position.y) if horizontal else (position.x, tile * size))
+            if pellet is not None:
+                count += 1
+                if pellet.name == POWERPELLET or count in self.pelletCounts or count == last:
+                    return max((tile * size - along) * sign - reach, 0) / pacman.speed
+            tile += sign
+        return self.maxStep
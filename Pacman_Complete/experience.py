@@ -0,0 +1,79 @@
+import numpy as np
+from qtable import ACTIONS, ArrayQTable, actionMask
+
+class ReplayBuffer(object):
+    """
+    Fixed capacity ring buffer of transitions in preallocated arrays, the newest transitions overwrite the oldest
+
+    States are stored as ids of an ArrayQTable and actions as its columns.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity)
+        self.nextStates = np.zeros(capacity, dtype=np.int64)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+        self.nextMasks = np.zeros(capacity, dtype=np.uint8) # Valid actions of the next state
+        self.index = 0 # Where the next transition goes
+        self.size = 0
+
+    def add(self, state, action, reward, nextState, done, nextMask):
+        i = self.index
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.nextStates[i] = nextState
+        self.dones[i] = done
+        self.nextMasks[i] = nextMask
+        self.index = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batchSize, rng):
+        """
+        Returns the buffer positions of batchSize transitions drawn uniformly with replacement
+        """
+        return rng.integers(self.size, size=batchSize)
+
+
+class ExperienceReplay(object):
+    """
+    Q-learning from a replay buffer instead of one update per transition
+
+    Every transition Pacman learns from goes into the buffer, then updatesPerStep batches of
+    batchSize transitions are sampled from it and applied as vectorized updates of an array-backed
+    Q-table. The updated values are written back into Pacman's q_table, so choosing actions and
+    saving the policy work as without replay. The game keeps one Pacman for every level and restart,
+    so the buffer, the array and his q_table stay in step, attach only joins them when he is made.
+    """
+    def __init__(self, capacity=100000, batchSize=32, updatesPerStep=1, rng=None):
+        if rng is None:
+            rng = np.random.default_rng()
+        self.buffer = ReplayBuffer(capacity)
+        self.table = ArrayQTable()
+        self.batchSize = batchSize
+        self.updatesPerStep = updatesPerStep
+        self.rng = rng
+        self.updates = 0
+
+    def attach(self, pacman):
+        """
+        Copies the values learned so far into the q_table of Pacman, once he is made and has loaded the saved policy
+        """
+        self.table.toPolicy(pacman.q_table)
+
+    def learn(self, pacman, state, action, reward, nextState, nextActions):
+        if action not in ACTIONS:
+            return # Pacman was standing still, there is no column for it
+        q_table = pacman.q_table
+        s = self.table.stateId(state, q_table)
+        done = not nextState
+        s2 = s if done else self.table.stateId(nextState, q_table) # The next state of a terminal transition is never read
+        self.buffer.add(s, ACTIONS.index(action), reward, s2, done, actionMask(nextActions))
+        buffer = self.buffer
+        for i in range(self.updatesPerStep):
+            batch = buffer.sample(self.batchSize, self.rng)
+            pairs = self.table.update(buffer.states[batch], buffer.actions[batch], buffer.rewards[batch], buffer.nextStates[batch],
+                                      buffer.dones[batch], buffer.nextMasks[batch], pacman.alpha, pacman.gamma)
+            self.table.writeBack(pairs, q_table)
+            self.updates += 1
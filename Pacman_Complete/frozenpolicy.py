@@ -0,0 +1,91 @@
+import bisect
+import numpy as np
+from constants import *
+from qtable import ACTIONS
+from states import convertLegacyTable
+
+# A frozen policy keeps, for every state in a Q-table, only the order of the actions by Q-value.
+# The packed integer states (see states.py) are kept sorted, so a lookup is a binary search.
+# The order of a state is a 16-bit choice: the action columns from best to worst, 2 bits each,
+# then 3 bits telling whether each action ties with the next one.
+TIESHIFT = 8
+
+def encodeChoice(q_values):
+    """
+    Returns the 16-bit choice of the Q-values of the actions in ACTIONS order
+    """
+    order = sorted(range(len(ACTIONS)), key=lambda column: -q_values[column])
+    choice = 0
+    for rank, column in enumerate(order):
+        choice |= column << (2 * rank)
+        if rank + 1 < len(order) and q_values[column] == q_values[order[rank + 1]]:
+            choice |= 1 << (TIESHIFT + rank)
+    return choice
+
+
+class FrozenPolicy(object):
+    """
+    Read-only greedy policy made from a Q-table, see fromQTable
+
+    Picks the same actions as Pacman.choose_action with epsilon 0, entries missing from the
+    Q-table count as 0 and ties are broken at random, while holding 10 bytes per state.
+    """
+    def __init__(self, states, choices):
+        self.states = states
+        self.choices = choices
+        # Binary search through a memoryview, which indexes faster than a NumPy array
+        self.view = memoryview(np.ascontiguousarray(states, dtype=np.int64)).cast("B").cast("q")
+
+    def __len__(self):
+        return len(self.choices)
+
+    @classmethod
+    def fromQTable(cls, q_table):
+        values = {}
+        for (state, action), value in convertLegacyTable(q_table).items():
+            if not state or action not in ACTIONS:
+                continue
+            if state not in values:
+                values[state] = [0.0] * len(ACTIONS)
+            values[state][ACTIONS.index(action)] = value
+        states = np.fromiter(values.keys(), dtype=np.int64, count=len(values))
+        choices = np.array([encodeChoice(q) for q in values.values()], dtype=np.uint16)
+        order = np.argsort(states)
+        return cls(states[order], choices[order])
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            return cls(data["states"], data["choices"])
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            np.savez(f, states=self.states, choices=self.choices)
+
+    def lookup(self, state):
+        """
+        Returns the choice of state, or None for a state the Q-table did not hold
+        """
+        i = bisect.bisect_left(self.view, state)
+        if i < len(self.view) and self.view[i] == state:
+            return int(self.choices[i])
+        return None
+
+    def action(self, state, available_actions, rng):
+        """
+        Returns the available action with the highest Q-value, ties broken at random
+        """
+        choice = self.lookup(state)
+        if choice is None:
+            return available_actions[rng.integers(len(available_actions))]
+        candidates = []
+        for rank in range(len(ACTIONS)):
+            action = ACTIONS[(choice >> (2 * rank)) & 3]
+            if action in available_actions:
+                candidates.append(action)
+            tied = rank + 1 < len(ACTIONS) and (choice >> (TIESHIFT + rank)) & 1
+            if len(candidates) > 0 and not tied:
+                break
+        if len(candidates) == 0:
+            return available_actions[rng.integers(len(available_actions))]
+        return candidates[rng.integers(len(candidates))]
@@ -1,21 +1,16 @@
-import pygame
 from entity import Entity
 from constants import *
-from sprites import FruitSprites
 
 class Fruit(Entity):
-    def __init__(self, node, level=0):
+    def __init__(self, node, timers, level=0):
         Entity.__init__(self, node)
         self.name = FRUIT
         self.color = GREEN
         self.lifespan = 5
-        self.timer = 0
         self.destroy = False
+        self.timer = timers.schedule(self.lifespan, self.expire)
         self.points = 100 + level*20
         self.setBetweenNodes(RIGHT)
-        self.sprites = FruitSprites(self, level)
 
-    def update(self, dt):
-        self.timer += dt
-        if self.timer >= self.lifespan:
-            self.destroy = True
\ No newline at end of file
+    def expire(self):
+        self.destroy = True
\ No newline at end of file
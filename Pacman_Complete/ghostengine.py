@@ -0,0 +1,293 @@
+import numpy as np
+from constants import *
+
+# The ghosts of many games on the same maze, held as arrays indexed by [game, ghost] instead of
+# as Ghost objects, so one update moves every ghost of every game with a few NumPy operations.
+# The rules are those of ghosts.py, modes.py and Entity.update. Directions keep the values of
+# constants.py in the arrays, and index the columns below through DIRECTIONINDEX.
+GHOSTS = [BLINKY, PINKY, INKY, CLYDE]
+BL, PI, IN, CL = range(len(GHOSTS))
+COLUMNS = np.array([UP, DOWN, LEFT, RIGHT, STOP])
+VECTORS = np.array([[0, -1], [0, 1], [-1, 0], [1, 0], [0, 0]], dtype=float)
+DIRECTIONINDEX = np.zeros(5, dtype=np.intp) # Column of a direction d at d + 2
+DIRECTIONINDEX[COLUMNS + 2] = np.arange(len(COLUMNS))
+SCATTERGOALS = np.array([[0, 0], [TILEWIDTH*NCOLS, 0], [TILEWIDTH*NCOLS, TILEHEIGHT*NROWS], [0, TILEHEIGHT*NROWS]], dtype=float)
+
+def columns(directions):
+    return DIRECTIONINDEX[np.asarray(directions) + 2]
+
+
+class GhostEngine(object):
+    """
+    Structure-of-arrays ghosts of games that all play on one maze, see fromGhostGroup
+
+    update plays a frame of every game at once, the game logic around it, collisions, pellets
+    and pauses, tells the engine what happened through startFreight, startSpawn, allowAccess
+    and reset. Modes, goals and moves follow GhostGroup exactly, except that frightened ghosts
+    draw their random directions in a different order, so seeded games do not match the Ghost
+    objects once a power pellet has been eaten. Mode timers count down per game instead of
+    running on a Scheduler.
+    """
+    def __init__(self, nodes, games, speedModifier=1, rng=None):
+        self.games = games
+        self.speedModifier = speedModifier
+        self.rng = rng if rng is not None else np.random.default_rng()
+        nodeCount = len(nodes.nodeList)
+        self.nodePositions = np.array([node.position.asTuple() for node in nodes.nodeList], dtype=float)
+        self.neighbors = np.full((nodeCount, len(COLUMNS)), -1, dtype=np.intp) # STOP column stays -1
+        self.portal = np.full(nodeCount, -1, dtype=np.intp)
+        for node in nodes.nodeList:
+            for column, direction in enumerate(COLUMNS[:4]):
+                if node.neighbors[direction] is not None:
+                    self.neighbors[node.id, column] = node.neighbors[direction].id
+            if node.neighbors[PORTAL] is not None:
+                self.portal[node.id] = node.neighbors[PORTAL].id
+        shape = (games, len(GHOSTS))
+        self.access = np.zeros(shape + (nodeCount, 4), dtype=bool) # Whether a ghost may leave a node in a direction
+        self.position = np.zeros(shape + (2,))
+        self.swept = (np.zeros(shape + (2,)), np.zeros(shape + (2,))) # Start and end of the last moves, see Entity.swept
+        self.node = np.zeros(shape, dtype=np.intp)
+        self.target = np.zeros(shape, dtype=np.intp)
+        self.direction = np.zeros(shape, dtype=np.intp)
+        self.speed = np.zeros(shape)
+        self.goal = np.zeros(shape + (2,))
+        self.randomMove = np.zeros(shape, dtype=bool) # Moving by randomDirection instead of goalDirection
+        self.mode = np.zeros(shape, dtype=np.intp)
+        self.freightTimer = np.full(shape, np.inf) # Time left in freight mode
+        self.points = np.full(shape, 200)
+        self.mainMode = np.zeros(games, dtype=np.intp)
+        self.mainTimer = np.zeros(games) # Time until the scatter and chase cycle switches
+        self.startNode = np.zeros(len(GHOSTS), dtype=np.intp)
+        self.spawnNode = np.zeros(len(GHOSTS), dtype=np.intp)
+        self.homeNode = np.zeros(len(GHOSTS), dtype=np.intp)
+        self.scatterTime = 7
+        self.chaseTime = 20
+        self.freightTime = 7 / speedModifier
+        self.tolerance = 1e-9 # As Scheduler.tolerance
+
+    @classmethod
+    def fromGhostGroup(cls, ghosts, nodes, games, rng=None):
+        """
+        Returns an engine of games copies of ghosts as they are, on the maze of nodes
+
+        Build it after startGame has set the level up, the copies take over the ghosts' nodes,
+        access, modes and timers.
+        """
+        blinky = ghosts.blinky
+        engine = cls(nodes, games, blinky.speedModifier, rng)
+        mainmode = ghosts.mainmode
+        engine.scatterTime = 7 / mainmode.speedModifier
+        engine.chaseTime = 20 / mainmode.speedModifier
+        engine.freightTime = 7 / blinky.mode.speedModifier
+        engine.mainMode[:] = mainmode.mode
+        engine.mainTimer[:] = mainmode.timers.remaining(mainmode.timer)
+        for i, ghost in enumerate(ghosts):
+            for node in nodes.nodeList:
+                for column, direction in enumerate(COLUMNS[:4]):
+                    engine.access[:, i, node.id, column] = ghost.name in node.access[direction]
+            engine.position[:, i] = ghost.position.asTuple()
+            engine.swept[0][:, i] = ghost.swept[0].asTuple()
+            engine.swept[1][:, i] = ghost.swept[1].asTuple()
+            engine.node[:, i] = ghost.node.id
+            engine.target[:, i] = ghost.target.id
+            engine.direction[:, i] = ghost.direction
+            engine.speed[:, i] = ghost.speed
+            engine.goal[:, i] = ghost.goal.asTuple()
+            engine.randomMove[:, i] = ghost.directionMethod == ghost.randomDirection
+            engine.mode[:, i] = ghost.mode.current
+            if ghost.mode.timer is not None:
+                engine.freightTimer[:, i] = ghost.mode.timers.remaining(ghost.mode.timer)
+            engine.points[:, i] = ghost.points
+            engine.startNode[i] = ghost.startNode.id
+            engine.spawnNode[i] = ghost.spawnNode.id
+            engine.homeNode[i] = ghost.homeNode.id
+        return engine
+
+    def setSpeed(self, games, ghosts, speed):
+        self.speed[games, ghosts] = (speed * TILEWIDTH / 16) * self.speedModifier
+
+    def update(self, dt, pacmanPosition, pacmanDirection, active=None):
+        """
+        Plays a frame of dt, a number or one per game, in every game where active, Pacman's position and direction given per game
+
+        Like GhostGroup.update, the game's timers run out first and every ghost then updates its
+        mode, its goal and moves. Inky aims from where Blinky is after Blinky's move, so he
+        moves after the others.
+        """
+        dt = np.broadcast_to(np.asarray(dt, dtype=float), (self.games,))
+        active = np.ones(self.games, dtype=bool) if active is None else np.asarray(active, dtype=bool)
+        pacmanPosition = np.asarray(pacmanPosition, dtype=float)
+        pacmanAhead = VECTORS[columns(pacmanDirection)] * TILEWIDTH
+        self.advanceTimers(dt, active)
+        self.updateModes(active)
+        aiming = active[:, None] & ((self.mode == SCATTER) | (self.mode == CHASE))
+        chase = self.mode == CHASE
+        goal = np.empty_like(self.goal)
+        goal[:] = SCATTERGOALS
+        goal[:, BL] = np.where(chase[:, BL, None], pacmanPosition, goal[:, BL])
+        goal[:, PI] = np.where(chase[:, PI, None], pacmanPosition + pacmanAhead * 4, goal[:, PI])
+        d = pacmanPosition - self.position[:, CL]
+        far = d[:, 0]**2 + d[:, 1]**2 > (TILEWIDTH * 8)**2
+        goal[:, CL] = np.where((chase[:, CL] & far)[:, None], pacmanPosition + pacmanAhead * 4, goal[:, CL])
+        self.goal = np.where(aiming[..., None], goal, self.goal)
+        others = np.zeros_like(aiming)
+        others[:, [BL, PI, CL]] = active[:, None]
+        self.move(dt, others)
+        blinky = self.position[:, BL]
+        inky = blinky + (pacmanPosition + pacmanAhead * 2 - blinky) * 2
+        self.goal[:, IN] = np.where((aiming[:, IN] & chase[:, IN])[:, None], inky, self.goal[:, IN])
+        self.move(dt, active[:, None] & (np.arange(len(GHOSTS)) == IN))
+
+    def advanceTimers(self, dt, active):
+        self.mainTimer -= np.where(active, dt, 0)
+        switch = active & (self.mainTimer <= self.tolerance)
+        while switch.any(): # A long frame can hold more than one switch
+            toChase = switch & (self.mainMode == SCATTER)
+            toScatter = switch & (self.mainMode == CHASE)
+            self.mainMode[toChase] = CHASE
+            self.mainMode[toScatter] = SCATTER
+            self.mainTimer += np.where(toChase, self.chaseTime, np.where(toScatter, self.scatterTime, 0))
+            switch = active & (self.mainTimer <= self.tolerance)
+        self.freightTimer -= np.where(active, dt, 0)[:, None]
+        games, ghosts = np.nonzero(self.freightTimer <= self.tolerance)
+        self.freightTimer[games, ghosts] = np.inf
+        self.normalMode(games, ghosts)
+
+    def updateModes(self, active):
+        following = active[:, None] & ((self.mode == SCATTER) | (self.mode == CHASE))
+        self.mode = np.where(following, self.mainMode[:, None], self.mode)
+        games, ghosts = np.nonzero(active[:, None] & (self.mode == SPAWN) & (self.node == self.spawnNode))
+        self.normalMode(games, ghosts)
+
+    def normalMode(self, games, ghosts):
+        self.setSpeed(games, ghosts, 100)
+        self.randomMove[games, ghosts] = False
+        self.access[games, ghosts, self.homeNode[ghosts], columns(DOWN)] = False
+        self.mode[games, ghosts] = self.mainMode[games]
+
+    def newTarget(self, games, ghosts, node, direction):
+        """
+        Returns the node a ghost at node reaches moving in direction, node itself if it may not, as Entity.getNewTarget
+        """
+        column = columns(direction)
+        neighbor = self.neighbors[node, column]
+        allowed = self.access[games, ghosts, node, np.minimum(column, 3)] & (neighbor >= 0)
+        return np.where(allowed, neighbor, node)
+
+    def move(self, dt, moving):
+        """
+        Moves the ghosts where moving, and sets off those that passed their target, as Entity.update
+        """
+        games, ghosts = np.nonzero(moving)
+        if len(games) == 0:
+            return
+        positions = self.nodePositions
+        node = self.node[games, ghosts]
+        target = self.target[games, ghosts]
+        direction = self.direction[games, ghosts]
+        start = self.position[games, ghosts]
+        position = start + VECTORS[columns(direction)] * self.speed[games, ghosts][:, None] * dt[games][:, None]
+        toTarget = positions[target] - positions[node]
+        travelled = position - positions[node]
+        over = travelled[:, 0]**2 + travelled[:, 1]**2 >= toTarget[:, 0]**2 + toTarget[:, 1]**2
+        end = position.copy()
+
+        arrived = np.nonzero(over)[0]
+        g, h = games[arrived], ghosts[arrived]
+        node = target[arrived]
+        heading = direction[arrived]
+        end[arrived] = positions[node]
+        # Node.validDirections: no reversing unless there is no other way
+        ways = self.access[g, h, node] & (self.neighbors[node, :4] >= 0) & (COLUMNS[None, :4] != -heading[:, None])
+        choice = self.goalColumns(node, self.goal[g, h], ways)
+        rolling = np.nonzero(self.randomMove[g, h] & ways.any(1))[0]
+        if len(rolling):
+            roll = self.rng.integers(ways[rolling].sum(1))
+            choice[rolling] = np.argmax(np.cumsum(ways[rolling], 1) > roll[:, None], 1)
+        chosen = np.where(ways.any(1), COLUMNS[choice], -heading)
+        node = np.where(self.portal[node] >= 0, self.portal[node], node)
+        target = self.newTarget(g, h, node, chosen)
+        turned = target != node
+        target = np.where(turned, target, self.newTarget(g, h, node, heading))
+        position[arrived] = positions[node]
+
+        self.node[g, h] = node
+        self.target[g, h] = target
+        self.direction[g, h] = np.where(turned, chosen, heading)
+        self.position[games, ghosts] = position
+        self.swept[0][games, ghosts] = start
+        self.swept[1][games, ghosts] = end
+
+    def goalColumns(self, node, goal, ways):
+        """
+        Returns the column of the way out of node that ends closest to goal, the first one on ties, as Entity.goalDirection
+        """
+        ends = self.nodePositions[node][:, None, :] + VECTORS[None, :4] * TILEWIDTH - goal[:, None, :]
+        distances = np.where(ways, ends[..., 0]**2 + ends[..., 1]**2, np.inf)
+        return np.argmin(distances, 1)
+
+    def startFreight(self, games):
+        """
+        Frightens the ghosts of games, as GhostGroup.startFreight
+        """
+        frightened = np.zeros(self.mode.shape, dtype=bool)
+        frightened[games] = True
+        frightened &= self.mode != SPAWN
+        games, ghosts = np.nonzero(frightened)
+        self.freightTimer[games, ghosts] = self.freightTime
+        self.mode[games, ghosts] = FREIGHT
+        self.setSpeed(games, ghosts, 50)
+        self.randomMove[games, ghosts] = True
+        self.points[games] = 200
+
+    def startSpawn(self, games, ghosts):
+        """
+        Sends eaten frightened ghosts home, as Ghost.startSpawn
+        """
+        games, ghosts = np.broadcast_arrays(games, ghosts)
+        eaten = self.mode[games, ghosts] == FREIGHT
+        games, ghosts = games[eaten], ghosts[eaten]
+        self.freightTimer[games, ghosts] = np.inf
+        self.mode[games, ghosts] = SPAWN
+        self.setSpeed(games, ghosts, 150)
+        self.randomMove[games, ghosts] = False
+        self.goal[games, ghosts] = self.nodePositions[self.spawnNode[ghosts]]
+
+    def updatePoints(self, games):
+        self.points[games] *= 2
+
+    def allowAccess(self, games, ghosts, node, direction):
+        self.access[games, ghosts, node, columns(direction)] = True
+
+    def denyAccess(self, games, ghosts, node, direction):
+        self.access[games, ghosts, node, columns(direction)] = False
+
+    def reset(self, games):
+        """
+        Puts the ghosts of games back on their start nodes, as GhostGroup.reset
+
+        The speed is set through setSpeed, as Entity.reset does, so both scale it by TILEWIDTH / 16 and speedModifier.
+        """
+        start = self.startNode
+        self.node[games] = start
+        self.target[games] = start
+        self.position[games] = self.nodePositions[start]
+        self.swept[0][games] = self.nodePositions[start]
+        self.swept[1][games] = self.nodePositions[start]
+        self.direction[games] = STOP
+        self.setSpeed(games, slice(None), 100)
+        self.points[games] = 200
+        self.randomMove[games] = False
+
+    def sweptCollide(self, pacmanStart, pacmanEnd, radius):
+        """
+        Returns, per game and ghost, whether Pacman's move from pacmanStart to pacmanEnd came within radius of the ghost's last move, as Entity.sweptCollide
+        """
+        d0 = self.swept[0] - np.asarray(pacmanStart, dtype=float)[:, None]
+        d1 = self.swept[1] - np.asarray(pacmanEnd, dtype=float)[:, None]
+        segment = d1 - d0
+        length = segment[..., 0]**2 + segment[..., 1]**2
+        along = -(d0[..., 0] * segment[..., 0] + d0[..., 1] * segment[..., 1])
+        t = np.clip(np.divide(along, length, out=np.zeros_like(length), where=length > 0), 0, 1)
+        d = d0 + segment * t[..., None]
+        return d[..., 0]**2 + d[..., 1]**2 <= radius**2
@@ -1,20 +1,18 @@
-import pygame
-from pygame.locals import *
 from vector import Vector2
 from constants import *
 from entity import Entity
-from modes import ModeController
-from sprites import GhostSprites
+from modes import MainMode, ModeController
+import numpy as np
 
 class Ghost(Entity):
-    def __init__(self, node, pacman=None, blinky=None):
-        Entity.__init__(self, node)
+    def __init__(self, node, pacman=None, blinky=None, rng=None, mainmode=None):
+        Entity.__init__(self, node, rng)
         self.name = GHOST
         self.points = 200
         self.goal = Vector2()
         self.directionMethod = self.goalDirection
         self.pacman = pacman
-        self.mode = ModeController(self)
+        self.mode = ModeController(self, mainmode)
         self.blinky = blinky
         self.homeNode = node
 
@@ -24,8 +22,9 @@ class Ghost(Entity):
         self.directionMethod = self.goalDirection
 
     def update(self, dt):
-        self.sprites.update(dt)
-        self.mode.update(dt)
+        if self.sprites is not None:
+            self.sprites.update(dt)
+        self.mode.update()
         if self.mode.current is SCATTER:
             self.scatter()
         elif self.mode.current is CHASE:
@@ -63,19 +62,17 @@ class Ghost(Entity):
         self.homeNode.denyAccess(DOWN, self)
 
 class Blinky(Ghost):
-    def __init__(self, node, pacman=None, blinky=None):
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, pacman=None, blinky=None, rng=None, mainmode=None):
+        Ghost.__init__(self, node, pacman, blinky, rng, mainmode)
         self.name = BLINKY
         self.color = RED
-        self.sprites = GhostSprites(self)
 
 
 class Pinky(Ghost):
-    def __init__(self, node, pacman=None, blinky=None):
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, pacman=None, blinky=None, rng=None, mainmode=None):
+        Ghost.__init__(self, node, pacman, blinky, rng, mainmode)
         self.name = PINKY
         self.color = PINK
-        self.sprites = GhostSprites(self)
 
     def scatter(self):
         self.goal = Vector2(TILEWIDTH*NCOLS, 0)
@@ -84,11 +81,10 @@ class Pinky(Ghost):
         self.goal = self.pacman.position + self.pacman.directions[self.pacman.direction] * TILEWIDTH * 4
 
 class Inky(Ghost):
-    def __init__(self, node, pacman=None, blinky=None):
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, pacman=None, blinky=None, rng=None, mainmode=None):
+        Ghost.__init__(self, node, pacman, blinky, rng, mainmode)
         self.name = INKY
         self.color = TEAL
-        self.sprites = GhostSprites(self)
 
     def scatter(self):
         self.goal = Vector2(TILEWIDTH*NCOLS, TILEHEIGHT*NROWS)
@@ -100,11 +96,10 @@ class Inky(Ghost):
 
 
 class Clyde(Ghost):
-    def __init__(self, node, pacman=None, blinky=None):
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, pacman=None, blinky=None, rng=None, mainmode=None):
+        Ghost.__init__(self, node, pacman, blinky, rng, mainmode)
         self.name = CLYDE
         self.color = ORANGE
-        self.sprites = GhostSprites(self)
 
     def scatter(self):
         self.goal = Vector2(0, TILEHEIGHT*NROWS)
@@ -119,11 +114,16 @@ class Clyde(Ghost):
 
 
 class GhostGroup(object):
-    def __init__(self, node, pacman):
-        self.blinky = Blinky(node, pacman)
-        self.pinky = Pinky(node, pacman)
-        self.inky = Inky(node, pacman, self.blinky)
-        self.clyde = Clyde(node, pacman)
+    def __init__(self, node, pacman, timers, rng=None):
+        # The ghosts share one random number generator, so a seeded generator makes their random moves reproducible
+        if rng is None:
+            rng = np.random.default_rng()
+        # and one scatter and chase cycle, timed on timers
+        self.mainmode = MainMode(timers)
+        self.blinky = Blinky(node, pacman, rng=rng, mainmode=self.mainmode)
+        self.pinky = Pinky(node, pacman, rng=rng, mainmode=self.mainmode)
+        self.inky = Inky(node, pacman, self.blinky, rng=rng, mainmode=self.mainmode)
+        self.clyde = Clyde(node, pacman, rng=rng, mainmode=self.mainmode)
         self.ghosts = [self.blinky, self.pinky, self.inky, self.clyde]
 
     def __iter__(self):
@@ -162,6 +162,23 @@ class GhostGroup(object):
         for ghost in self:
             ghost.reset()
 
+    def restart(self):
+        """
+        Puts the ghosts back the way a new GhostGroup starts a level, for another level on the same maze
+        """
+        self.mainmode.scatter()
+        for ghost in self:
+            ghost.mode.restart()
+            ghost.reset()
+            ghost.goal = Vector2()
+            if ghost.sprites is not None:
+                ghost.image = ghost.sprites.getStartImage()
+
+    def stopTimers(self):
+        self.mainmode.stop()
+        for ghost in self:
+            ghost.mode.stop()
+
     def render(self, screen):
         for ghost in self:
             ghost.render(screen)
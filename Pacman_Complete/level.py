@@ -0,0 +1,69 @@
+import threading
+from constants import *
+from nodes import NodeGroup
+from pellets import PelletGroup
+
+class Level(object):
+    """
+    The node graph, pellets, ghosts and backgrounds of one maze
+
+    GameController builds one the first time a maze is played and resets it in place
+    every time a level is played on the maze again, instead of reading the maze files anew.
+    """
+    def __init__(self, maze, timers):
+        self.maze = maze
+        self.nodes = NodeGroup(maze.name+".txt")
+        maze.setPortalPairs(self.nodes)
+        maze.connectHomeNodes(self.nodes)
+        self.pellets = PelletGroup(maze.name+".txt")
+        self.pellets.timers = timers # The flashing starts with the level, see PelletGroup.reset
+        self.ghosts = None # Made by the game, once there is a Pacman for them to chase
+        self.mazesprites = None # Only made by games that render
+        self.backgrounds = {} # Normal background by colour, level % 5
+        self.background_flash = None
+
+    def drawBackgrounds(self, colour):
+        """
+        Draws the maze in colour, and the flashing background, unless they are drawn already
+
+        Only call it from the game's thread, pygame surfaces are not safe to make or convert from another.
+        """
+        import pygame
+        from sprites import MazeSprites
+        if self.mazesprites is None:
+            self.mazesprites = MazeSprites(self.maze.name+".txt", self.maze.name+"_rotation.txt")
+            background = pygame.surface.Surface(SCREENSIZE).convert()
+            background.fill(BLACK)
+            self.background_flash = self.mazesprites.constructBackground(background, 5)
+        if colour not in self.backgrounds:
+            background = pygame.surface.Surface(SCREENSIZE).convert()
+            background.fill(BLACK)
+            self.backgrounds[colour] = self.mazesprites.constructBackground(background, colour)
+
+
+class LevelLoader(object):
+    """
+    Builds the node graph and pellets of a maze into a Level in a thread
+
+    The thread touches nothing the game uses and no pygame, the pellets only get timers and start flashing
+    on them when the level starts, and the backgrounds are drawn by the game when it takes the level over.
+    finish waits for the thread and returns the new Level.
+    """
+    def __init__(self, index, maze, timers):
+        self.index = index # Index of the maze in MazeData.mazedict
+        self.level = None
+        self.error = None
+        self.thread = threading.Thread(target=self.load, args=(maze, timers), daemon=True)
+        self.thread.start()
+
+    def load(self, maze, timers):
+        try:
+            self.level = Level(maze, timers)
+        except Exception as error:
+            self.error = error # Raised by finish, in the game's thread
+
+    def finish(self):
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.level
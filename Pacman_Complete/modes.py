@@ -1,63 +1,77 @@
 from constants import *
 
 class MainMode(object):
-    def __init__(self, speedModifier):
-        self.timer = 0
+    """
+    The scatter and chase cycle all ghosts follow, switched by a timer on timers
+    """
+    def __init__(self, timers, speedModifier=1):
+        self.timers = timers
         self.speedModifier = speedModifier
+        self.timer = None
         self.scatter()
 
-    def update(self, dt):
-        self.timer += dt
-        if self.timer >= self.time:
-            if self.mode is SCATTER:
-                self.chase()
-            elif self.mode is CHASE:
-                self.scatter()
+    def switch(self):
+        if self.mode is SCATTER:
+            self.chase()
+        elif self.mode is CHASE:
+            self.scatter()
 
     def scatter(self):
         self.mode = SCATTER
         self.time = 7 / self.speedModifier
-        self.timer = 0
+        self.setTimer()
 
     def chase(self):
         self.mode = CHASE
         self.time = 20 / self.speedModifier
-        self.timer = 0
+        self.setTimer()
+
+    def setTimer(self):
+        self.timers.cancel(self.timer)
+        self.timer = self.timers.schedule(self.time, self.switch)
+
+    def stop(self):
+        self.timers.cancel(self.timer)
 
 
 class ModeController(object):
-    def __init__(self, entity):
-        self.timer = 0
-        self.time = None
+    def __init__(self, entity, mainmode):
+        self.timer = None # Ends freight mode
         self.speedModifier = 1
-        self.mainmode = MainMode(self.speedModifier)
+        self.mainmode = mainmode
+        self.timers = mainmode.timers
         self.current = self.mainmode.mode
         self.entity = entity
 
-    def update(self, dt):
-        self.mainmode.update(dt)
-        if self.current is FREIGHT:
-            self.timer += dt
-            if self.timer >= self.time:
-                self.time = None
-                self.entity.normalMode()
-                self.current = self.mainmode.mode
-        elif self.current in [SCATTER, CHASE]:
+    def update(self):
+        if self.current in [SCATTER, CHASE]:
             self.current = self.mainmode.mode
-
-        if self.current is SPAWN:
+        elif self.current is SPAWN:
             if self.entity.node == self.entity.spawnNode:
                 self.entity.normalMode()
                 self.current = self.mainmode.mode
 
+    def endFreight(self):
+        self.timer = None
+        self.entity.normalMode()
+        self.current = self.mainmode.mode
+
     def setFreightMode(self):
-        if self.current in [SCATTER, CHASE]:
-            self.timer = 0
-            self.time = 7 / self.speedModifier
+        if self.current in [SCATTER, CHASE, FREIGHT]:
+            self.timers.cancel(self.timer)
+            self.timer = self.timers.schedule(7 / self.speedModifier, self.endFreight)
             self.current = FREIGHT
-        elif self.current is FREIGHT:
-            self.timer = 0
 
     def setSpawnMode(self):
         if self.current is FREIGHT:
-            self.current = SPAWN
\ No newline at end of file
+            self.timers.cancel(self.timer)
+            self.timer = None
+            self.current = SPAWN
+
+    def stop(self):
+        self.timers.cancel(self.timer)
+
+    def restart(self):
+        self.stop()
+        self.timer = None
+        self.current = self.mainmode.mode
@@ -1,26 +1,51 @@
-import pygame
 from vector import Vector2
 from constants import *
 import numpy as np
 
 class Node(object):
-    def __init__(self, x, y):
+    def __init__(self, x, y, id=0):
+        self.id = id # Dense index of the node in its NodeGroup
         self.position = Vector2(x, y)
         self.neighbors = {UP:None, DOWN:None, LEFT:None, RIGHT:None, PORTAL:None}
         self.access = {UP:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT], 
                        DOWN:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT], 
                        LEFT:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT], 
                        RIGHT:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT]}
+        self.directionCache = {} # (entity name, direction) -> valid directions, see validDirections
 
     def denyAccess(self, direction, entity):
         if entity.name in self.access[direction]:
             self.access[direction].remove(entity.name)
+            self.clearDirections()
 
     def allowAccess(self, direction, entity):
         if entity.name not in self.access[direction]:
             self.access[direction].append(entity.name)
+            self.clearDirections()
+
+    def validDirections(self, name, direction):
+        """
+        Returns a tuple of the directions the entity called name may leave this node in when moving in direction
+
+        Reversing is left out unless it is the only way out. The result is cached until access
+        or neighbors change, so it is computed once per node and entity instead of at every arrival.
+        """
+        key = (name, direction)
+        if key not in self.directionCache:
+            directions = []
+            for d in [UP, DOWN, LEFT, RIGHT]:
+                if name in self.access[d] and self.neighbors[d] is not None and d != direction * -1:
+                    directions.append(d)
+            if len(directions) == 0:
+                directions.append(direction * -1)
+            self.directionCache[key] = tuple(directions)
+        return self.directionCache[key]
+
+    def clearDirections(self):
+        self.directionCache.clear()
 
     def render(self, screen):
+        import pygame
         for n in self.neighbors.keys():
             if self.neighbors[n] is not None:
                 line_start = self.position.asTuple()
@@ -33,6 +58,7 @@ class NodeGroup(object):
     def __init__(self, level):
         self.level = level
         self.nodesLUT = {}
+        self.nodeList = [] # Nodes by id
         self.nodeSymbols = ['+', 'P', 'n']
         self.pathSymbols = ['.', '-', '|', 'p']
         data = self.readMazeFile(level)
@@ -49,7 +75,9 @@ class NodeGroup(object):
             for col in list(range(data.shape[1])):
                 if data[row][col] in self.nodeSymbols:
                     x, y = self.constructKey(col+xoffset, row+yoffset)
-                    self.nodesLUT[(x, y)] = Node(x, y)
+                    node = Node(x, y, len(self.nodeList))
+                    self.nodesLUT[(x, y)] = node
+                    self.nodeList.append(node)
 
     def constructKey(self, x, y):
         return x * TILEWIDTH, y * TILEHEIGHT
@@ -115,6 +143,8 @@ class NodeGroup(object):
         key = self.constructKey(*otherkey)
         self.nodesLUT[homekey].neighbors[direction] = self.nodesLUT[key]
         self.nodesLUT[key].neighbors[direction*-1] = self.nodesLUT[homekey]
+        self.nodesLUT[homekey].clearDirections()
+        self.nodesLUT[key].clearDirections()
 
     def getNodeFromPixels(self, xpixel, ypixel):
         if (xpixel, ypixel) in self.nodesLUT.keys():
@@ -159,6 +189,17 @@ class NodeGroup(object):
         for entity in entities:
             self.allowHomeAccess(entity)
 
+    def saveAccess(self):
+        """
+        Remembers the access rules of every node, for resetAccess to go back to at the start of the next level
+        """
+        self.savedAccess = [{d: list(names) for d, names in node.access.items()} for node in self.nodeList]
+
+    def resetAccess(self):
+        for node, access in zip(self.nodeList, self.savedAccess):
+            node.access = {d: list(names) for d, names in access.items()}
+            node.clearDirections()
+
     def render(self, screen):
         for node in self.nodesLUT.values():
             node.render(screen)
\ No newline at end of file
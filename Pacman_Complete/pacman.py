@@ -1,9 +1,6 @@
-import pygame
-from pygame.locals import *
 from vector import Vector2
 from constants import *
-from entity import Entity
-from sprites import PacmanSprites
+from entity import Entity, closestOnSegment
 # new imports
 import numpy as np # Needed for utility functions
 from pellets import PelletGroup # Import pelletgroup to get pellets positions
@@ -11,43 +8,68 @@ from ghosts import GhostGroup
 import pickle
 from nodes import Node
 from nodes import NodeGroup
+from profiler import NULLPROFILER
+from traces import EligibilityTraces
+from qtable import BoundedQTable
+from states import GHOSTS, encodeState, tileIndex, convertLegacyTable
+import os
 
 class Pacman(Entity):
-    def __init__(self, node, pellet_group, nodes, learning, ghosts = None):
-        Entity.__init__(self, node)
+    def __init__(self, node, pellet_group, nodes, learning, ghosts = None, rng = None):
+        Entity.__init__(self, node, rng)
         self.name = PACMAN    
         self.color = YELLOW
         self.direction = LEFT
         self.setBetweenNodes(LEFT)
         self.alive = True
-        self.sprites = PacmanSprites(self)
         
         # Q-learning parameters
         self.q_table = {}
+        self.qCapacity = None # Most entries the Q-table may hold, None for no limit
+        self.qMemoryLimit = None # Bytes the Q-table may take up, None for no limit
         self.alpha = 0.5  # Learning rate
         self.gamma = 1  # Discount factor
         self.epsilon = 0.9  # Exploration rate
         self.epsilon_min = 0.1  # Minimum exploration rate
         self.decay_rate = 0.99  # Decay rate per episode
-        self.rng = np.random.default_rng()  # Random number generator
         self.reward = 0 # Reward to be given during learning
         self.learning = learning
+        self.traceDecay = 0 # Lambda of Watkins Q(lambda), 0 learns with one-step updates
+        self.traces = None # Eligibility traces of the visited (state, action) pairs while traceDecay > 0
+        self.explored = False # Whether the last chosen action was exploratory, which cuts the traces
 
         # Reference to the pellets and ghosts
         self.pellets : PelletGroup = pellet_group
         self.ghost_group : GhostGroup = ghosts
         self.nodes : NodeGroup = nodes
+        self.mazeIndex = 0 # Which maze the nodes belong to, part of the state
 
         # Holds the previous state and action to use when learning
         self.state = None
         self.prev_dir = self.direction
 
+        self.profiler = NULLPROFILER # Times getNewState, choose_action and learn when profiling is enabled
+        self.recorder = None # Replay the chosen directions are written to
+        self.playback = None # Replay the directions are read from instead of choosing them
+        self.transitionLog = None # Logs every learned transition for offline training
+        self.experience = None # Experience replay that learns in batches instead of one update per transition
+        self.agent = None # Agent that replaces the Q-table, e.g. agents.LinearAgent
+        self.planner = None # Dyna planner that replays modelled transitions after every update
+        self.frozen = None # Read-only greedy policy that chooses the actions instead of the Q-table, see frozenpolicy.py
+
     def set_epsilon(self, value):
         """
         Sets the epsilon value
         """
         self.epsilon = value
 
+    def setTraceDecay(self, value):
+        """
+        Sets lambda of Watkins Q(lambda), so rewards reach back along the path that led to them
+        """
+        self.traceDecay = value
+        self.traces = EligibilityTraces() if value > 0 else None
+
     def decay_epsilon(self):
         """
         Gradually reduces the epsilon / exploration parameter
@@ -60,15 +82,31 @@ class Pacman(Entity):
         """
         # Generate a random float between 0.0 and 1.0 to determine whether or not to explore based on the episilon parameter
         if self.rng.random() < self.epsilon:
-            return self.rng.choice(available_actions)
+            action = self.rng.choice(available_actions)
+            if self.traces is not None and self.agent is None:
+                # Only the Q-table has traces to cut, an agent's states are not Q-table keys
+                self.explored = not self.isGreedy(state, action, available_actions)
+            return action
+        elif self.agent is not None:
+            return self.agent.bestAction(state, available_actions, self.rng)
+        elif self.frozen is not None:
+            return self.frozen.action(state, available_actions, self.rng)
         else:
             # Choose the action with the highest Q-value for the current state
             q_values = [self.get_q_value(state, action) for action in available_actions]
             max_q_value = max(q_values)
             # In case of multiple max values, randomly select one
             max_indices = [i for i, q in enumerate(q_values) if q == max_q_value]
+            self.explored = False
             return available_actions[self.rng.choice(max_indices)]
 
+    def isGreedy(self, state, action, available_actions):
+        """
+        Returns whether action has the highest Q-value of the available actions, without adding entries to the Q-table
+        """
+        q_values = [self.q_table.get((state, a), 0) for a in available_actions]
+        return self.q_table.get((state, action), 0) == max(q_values)
+
     def get_q_value(self, state, action):
         """
         Returns the q-value in q table for the given state and action
@@ -81,24 +119,65 @@ class Pacman(Entity):
 
     def learn(self, prev_state, action, curr_state):        
         # Calculate q-value, inspired heavily by the function from the exercises
-        max_future_reward = 0
+        next_available_actions = []
         if curr_state:
             next_available_actions = self.validDirections()
+        if self.agent is not None:
+            self.agent.learn(prev_state, action, self.reward, curr_state, next_available_actions)
+            self.reward = 0
+            return
+        if self.transitionLog is not None:
+            self.transitionLog.record(prev_state, action, self.reward, curr_state, next_available_actions)
+        if self.experience is not None:
+            self.experience.learn(self, prev_state, action, self.reward, curr_state, next_available_actions)
+            self.reward = 0
+            return
+        max_future_reward = 0
+        if curr_state:
             max_future_reward = max([self.get_q_value(curr_state, action) for action in next_available_actions])
         current_q_value = self.get_q_value(prev_state, action)
-        self.q_table[(prev_state, action)] = current_q_value + self.alpha * (
-            self.reward + self.gamma * max_future_reward - current_q_value
-            )
+        if self.traces is not None:
+            # Watkins Q(lambda): the error updates every traced pair, the traces are cut after an exploratory action
+            self.traces.visit((prev_state, action))
+            self.traces.apply(self.q_table, self.alpha * (self.reward + self.gamma * max_future_reward - current_q_value))
+            if not curr_state or self.explored:
+                self.traces.clear()
+            else:
+                self.traces.decay(self.gamma * self.traceDecay)
+        else:
+            self.q_table[(prev_state, action)] = current_q_value + self.alpha * (
+                self.reward + self.gamma * max_future_reward - current_q_value
+                )
+        if self.planner is not None:
+            self.planner.observe(prev_state, action, self.reward, curr_state, next_available_actions)
+            with self.profiler.phase("pacman.plan"):
+                self.planner.plan(self.q_table, self.alpha, self.gamma, self.planner.stepsPerUpdate)
         self.reward = 0
 
     # Save and load policy, taken from the exercises
     def save_policy(self, filename):
+        if self.agent is not None:
+            self.agent.save(filename)
+            return
         with open(filename, "wb") as f:
             pickle.dump(self.q_table, f)
+        if isinstance(self.q_table, BoundedQTable):
+            with open(filename + ".visits", "wb") as f:
+                pickle.dump(self.q_table.visits, f)
 
     def load_policy(self, filename):
+        if self.agent is not None:
+            self.agent.load(filename)
+            return
         with open(filename, "rb") as f:
-            self.q_table = pickle.load(f)
+            self.q_table = convertLegacyTable(pickle.load(f))
+        if self.qCapacity is not None or self.qMemoryLimit is not None:
+            # Visit counts of a bounded table are kept next to the policy, so eviction carries on where it stopped
+            visits = None
+            if os.path.exists(filename + ".visits"):
+                with open(filename + ".visits", "rb") as f:
+                    visits = convertLegacyTable(pickle.load(f))
+            self.q_table = BoundedQTable(self.q_table, self.qCapacity, self.qMemoryLimit, visits)
 
     def setLearning(self, learn):
         """
@@ -116,6 +195,8 @@ class Pacman(Entity):
         """
         Calculates and returns the current state
         """
+        if self.agent is not None:
+            return self.agent.observe(self)
         # Rewards:
         # Moving to a node : -10, to enourage NOT moving around in circles
         # Getting a pellet : +10
@@ -137,28 +218,18 @@ class Pacman(Entity):
         
         closest_pellet_idx = pellets_dists.index(min(pellets_dists))
         closest_pellet = (self.pellets.pelletList + self.pellets.powerpellets)[closest_pellet_idx]
-        closest_pellet = (closest_pellet.position.x, closest_pellet.position.y)
-
-        # Check through the ghost's position and threat level
-        ghost_threats = []
-        blinky_pos = tuple()
-        pinky_pos = tuple()
-        inky_pos = tuple()
-        clyde_pos = tuple()
+        pellet_tile = tileIndex(closest_pellet.position.x, closest_pellet.position.y)
+
+        # Check through the ghost's node and threat level
+        ghost_nodes = [0, 0, 0, 0]
+        ghost_threats = [0, 0, 0, 0]
         for ghost in self.ghost_group.ghosts:
-            ghost_threats.append(ghost.mode.current)
-            if ghost.name == BLINKY:
-                blinky_pos = (round(ghost.node.position.x), round(ghost.node.position.y)) # We round to only store integer values of positions
-            elif ghost.name == PINKY:
-                pinky_pos = (round(ghost.node.position.x), round(ghost.node.position.y))
-            elif ghost.name == INKY:
-                inky_pos = (round(ghost.node.position.x), round(ghost.node.position.y))
-            elif ghost.name == CLYDE:
-                clyde_pos = (round(ghost.node.position.x), round(ghost.node.position.y))
-
-        threat_level = tuple(ghost_threats)
-        pacman_pos = (round(self.node.position.x), round(self.node.position.y))  
-        new_state = tuple([pacman_pos, threat_level, closest_pellet, blinky_pos, pinky_pos, inky_pos, clyde_pos])
+            i = GHOSTS.index(ghost.name)
+            ghost_nodes[i] = ghost.node.id
+            ghost_threats[i] = ghost.mode.current
+
+        # The state is packed into one integer, see states.py
+        new_state = encodeState(self.mazeIndex, self.node.id, pellet_tile, ghost_nodes, ghost_threats)
         ### Finish updating state ###
         return new_state
     
@@ -173,8 +244,20 @@ class Pacman(Entity):
         self.direction = LEFT
         self.setBetweenNodes(LEFT)
         self.alive = True
-        self.image = self.sprites.getStartImage()
-        self.sprites.reset()
+        if self.sprites is not None:
+            self.image = self.sprites.getStartImage()
+            self.sprites.reset()
+
+    def restart(self, node):
+        """
+        Starts pacman over from node for a new level or episode, keeping the q_table and what else he has learned
+        """
+        self.setStartNode(node)
+        self.reset()
+        self.reward = 0
+        self.explored = False
+        self.state = None
+        self.prev_dir = self.direction
 
     def die(self):
         # Learn when pacman dies
@@ -185,15 +268,26 @@ class Pacman(Entity):
         self.direction = STOP
 
     def update(self, dt):	
-        self.sprites.update(dt)
+        if self.sprites is not None:
+            self.sprites.update(dt)
+        start = self.position
         self.position += self.directions[self.direction]*self.speed*dt
+        end = self.position
 
         if self.overshotTarget():
             # Choose a direction based on the new state and the available directions
             # We do it after the node has been set, so that the available directions are based on the node we just reached
             self.node = self.target
-            new_state = self.getNewState()
-            direction = self.choose_action(new_state, self.validDirections())
+            end = self.node.position
+            with self.profiler.phase("pacman.getNewState"):
+                new_state = self.getNewState()
+            with self.profiler.phase("pacman.choose_action"):
+                if self.playback is not None:
+                    direction = self.playback.readAction()
+                else:
+                    direction = self.choose_action(new_state, self.validDirections())
+            if self.recorder is not None:
+                self.recorder.writeAction(direction)
 
             if self.node.neighbors[PORTAL] is not None:
                 self.node = self.node.neighbors[PORTAL]
@@ -213,22 +307,53 @@ class Pacman(Entity):
                 # self.state is the state we had on the previous node
                 # self.prev_dir is the direction we took from self.state to get to new_state
                 # new_state is the current state
-                self.learn(self.state, self.prev_dir, new_state)
+                with self.profiler.phase("pacman.learn"):
+                    self.learn(self.state, self.prev_dir, new_state)
             # Update the state attribute to hold the current state
             self.state = new_state
             # Update prev_dir to hold the new direction, that goes to some new node
             self.prev_dir = self.direction
+        self.swept = (start, end)
 
     def eatPellets(self, pelletList):
         for pellet in pelletList:
             if self.collideCheck(pellet):
-                # give rewards based on the pellet type
-                if pellet.name == POWERPELLET:
-                    self.reward += 50
-                if pellet.name == PELLET:
-                    self.reward += 10
+                self.rewardPellet(pellet)
                 return pellet
         return None    
+
+    def rewardPellet(self, pellet):
+        # give rewards based on the pellet type
+        if pellet.name == POWERPELLET:
+            self.reward += 50
+        if pellet.name == PELLET:
+            self.reward += 10
+
+    def sweepPellets(self, pellets):
+        """
+        Returns the pellets Pacman touched anywhere along his last move, in the order he reached them
+
+        eatPellets only looks at where Pacman ended up, which misses pellets passed during a long
+        frame. Pellets lie on the tiles, so only the tiles around the swept segment are looked up.
+        """
+        start, end = self.swept
+        reach = self.collideRadius + TILEWIDTH
+        cols = range(int((min(start.x, end.x) - reach) // TILEWIDTH) + 1, int((max(start.x, end.x) + reach) // TILEWIDTH) + 1)
+        rows = range(int((min(start.y, end.y) - reach) // TILEHEIGHT) + 1, int((max(start.y, end.y) + reach) // TILEHEIGHT) + 1)
+        eaten = []
+        for row in rows:
+            for col in cols:
+                pellet = pellets.tiles.get((col * TILEWIDTH, row * TILEHEIGHT))
+                if pellet is None:
+                    continue
+                t = closestOnSegment(pellet.position, start, end)
+                d = start + (end - start) * t - pellet.position
+                if d.magnitudeSquared() <= (self.collideRadius + pellet.collideRadius)**2:
+                    eaten.append((t, pellet))
+        eaten.sort(key=lambda item: item[0])
+        for t, pellet in eaten:
+            self.rewardPellet(pellet)
+        return [pellet for t, pellet in eaten]
     
     def collideGhost(self, ghost):
         return self.collideCheck(ghost)
@@ -1,25 +1,31 @@
 class Pause(object):
-    def __init__(self, paused=False):
+    def __init__(self, timers, paused=False):
         self.paused = paused
-        self.timer = 0
-        self.pauseTime = None
+        self.timers = timers
+        self.timer = None # Ends a pause set with a pauseTime
         self.func = None
-        
-    def update(self, dt):
-        if self.pauseTime is not None:
-            self.timer += dt
-            if self.timer >= self.pauseTime:
-                self.timer = 0
-                self.paused = False
-                self.pauseTime = None
-                return self.func
-        return None
 
     def setPause(self, playerPaused=False, pauseTime=None, func=None):
-        self.timer = 0
+        self.timers.cancel(self.timer)
+        self.timer = None
         self.func = func
-        self.pauseTime = pauseTime
+        if pauseTime is not None:
+            self.timer = self.timers.schedule(pauseTime, self.end)
         self.flip()
 
+    def end(self):
+        self.timer = None
+        self.paused = False
+        if self.func is not None:
+            self.func()
+
+    def remaining(self):
+        """
+        Returns the time until the pause ends by itself, or None
+        """
+        if self.timer is None:
+            return None
+        return self.timers.remaining(self.timer)
+
     def flip(self):
         self.paused = not self.paused
\ No newline at end of file
@@ -1,4 +1,3 @@
-import pygame
 from vector import Vector2
 from constants import *
 import numpy as np
@@ -14,6 +13,7 @@ class Pellet(object):
         self.visible = True
         
     def render(self, screen):
+        import pygame
         if self.visible:
             adjust = Vector2(TILEWIDTH, TILEHEIGHT) / 2
             p = self.position + adjust
@@ -26,26 +26,43 @@ class PowerPellet(Pellet):
         self.name = POWERPELLET
         self.radius = int(8 * TILEWIDTH / 16)
         self.points = 50
-        self.flashTime = 0.2
-        self.timer= 0
-        
-    def update(self, dt):
-        self.timer += dt
-        if self.timer >= self.flashTime:
-            self.visible = not self.visible
-            self.timer = 0
 
 
 class PelletGroup(object):
-    def __init__(self, pelletfile):
+    def __init__(self, pelletfile, timers=None):
         self.pelletList = []
         self.powerpellets = []
+        self.tiles = {} # Pellets left by their (x, y) position
         self.createPelletList(pelletfile)
+        self.allPellets = list(self.pelletList) # Every pellet of the maze, which reset puts back
+        self.numEaten = 0
+        self.flashTime = 0.2
+        self.timers = timers # Flashes the power pellets, they stay lit without
+        self.timer = None
+        if timers is not None:
+            self.timer = timers.schedule(self.flashTime, self.flash)
+
+    def reset(self):
+        """
+        Puts every eaten pellet back, for another level on the same maze
+        """
+        self.stopTimers()
+        self.pelletList = list(self.allPellets)
+        self.tiles = {pellet.position.asTuple(): pellet for pellet in self.pelletList}
         self.numEaten = 0
+        for powerpellet in self.powerpellets:
+            powerpellet.visible = True
+        if self.timers is not None:
+            self.timer = self.timers.schedule(self.flashTime, self.flash)
 
-    def update(self, dt):
+    def flash(self):
         for powerpellet in self.powerpellets:
-            powerpellet.update(dt)
+            powerpellet.visible = not powerpellet.visible
+        self.timer = self.timers.schedule(self.flashTime, self.flash)
+
+    def stopTimers(self):
+        if self.timers is not None:
+            self.timers.cancel(self.timer)
                 
     def createPelletList(self, pelletfile):
         data = self.readPelletfile(pelletfile)        
@@ -57,7 +74,13 @@ class PelletGroup(object):
                     pp = PowerPellet(row, col)
                     self.pelletList.append(pp)
                     self.powerpellets.append(pp)
-                    
+        for pellet in self.pelletList:
+            self.tiles[pellet.position.asTuple()] = pellet
+
+    def removePellet(self, pellet):
+        self.pelletList.remove(pellet)
+        del self.tiles[pellet.position.asTuple()]
+
     def readPelletfile(self, textfile):
         return np.loadtxt(textfile, dtype='<U1')
     
@@ -0,0 +1,358 @@
+import io
+import os
+import sys
+import pickle
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from collections import Counter
+import numpy as np
+from frozenpolicy import FrozenPolicy
+from states import decodeState, convertLegacyTable
+
+# Policies are pickled Q-tables, dicts from (state, action) to Q-value, optionally with the visit
+# counts of a bounded table in a <policy>.visits file next to them. Tables too large to hold
+# several of at once are split into shards by the hash of the state, so the entries of a state
+# always land in the same shard, and processed one shard at a time.
+#
+# A pickled dict can only be loaded whole, so every input policy, and its visits, still has to
+# fit in memory on its own: inspect, prune, convert and freeze hold one policy, and merge and diff
+# with --shards one policy while splitting it and then one shard of every policy. Outputs are
+# written item by item and never held whole.
+
+def loadPolicy(path):
+    """
+    Loads a policy, or its visits, with tuple states packed into integers
+    """
+    with open(path, "rb") as f:
+        return convertLegacyTable(pickle.load(f))
+
+def loadVisits(path):
+    """
+    Returns the visit counts saved next to the policy at path, or None
+    """
+    if os.path.exists(path + ".visits"):
+        return loadPolicy(path + ".visits")
+    return None
+
+
+class PolicyWriter(object):
+    """
+    Writes a pickled dict item by item, so the whole dict never has to be in memory
+
+    The file loads with pickle.load like any pickled dict. Items are written in batches, and
+    objects shared within a batch, such as the state of several actions, stay shared.
+    """
+    def __init__(self, path, batchSize=1000):
+        self.file = open(path, "wb")
+        self.buffer = io.BytesIO()
+        self.pickler = pickle.Pickler(self.buffer, protocol=2) # Its memo is kept for a batch, so shared objects are written once
+        self.batchSize = batchSize
+        self.items = []
+        self.count = 0
+        self.file.write(pickle.PROTO + bytes([2]) + pickle.EMPTY_DICT)
+
+    def write(self, key, value):
+        self.items.append((key, value))
+        if len(self.items) >= self.batchSize:
+            self.flush()
+
+    def flush(self):
+        if len(self.items) == 0:
+            return
+        # Every dump is a whole protocol 2 pickle, the 2 byte PROTO header and the STOP are cut off to leave the object
+        spans = []
+        for key, value in self.items:
+            for obj in (key, value):
+                start = self.buffer.tell()
+                self.pickler.dump(obj)
+                spans.append((start + 2, self.buffer.tell() - 1))
+        data = memoryview(self.buffer.getvalue())
+        self.file.write(pickle.MARK)
+        for start, end in spans:
+            self.file.write(data[start:end])
+        self.file.write(pickle.SETITEMS)
+        data.release()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.pickler.clear_memo()
+        self.count += len(self.items)
+        self.items = []
+
+    def close(self):
+        self.flush()
+        self.file.write(pickle.STOP)
+        self.file.close()
+
+
+def writeSorted(writer, table):
+    """
+    Writes the entries of table grouped by state, so the actions of a state share it in the file
+    """
+    for key in sorted(table, key=lambda key: (hash(key[0]), key[1])):
+        writer.write(key, table[key])
+
+
+class Shards(object):
+    """
+    Splits policies into shard files in a temporary directory, one policy in memory at a time
+    """
+    def __init__(self, paths, shards, directory=None):
+        self.paths = paths
+        self.shards = shards
+        self.directory = tempfile.mkdtemp(prefix="policyshards_", dir=directory)
+        for i, path in enumerate(paths):
+            self.split(i, loadPolicy(path), loadVisits(path))
+
+    def shardPath(self, policy, shard):
+        return os.path.join(self.directory, "%d_%d.pkl" % (policy, shard))
+
+    def split(self, policy, table, visits):
+        parts = [({}, {}) for shard in range(self.shards)]
+        for key, value in table.items():
+            part = parts[hash(key[0]) % self.shards]
+            part[0][key] = value
+            if visits is not None and key in visits:
+                part[1][key] = visits[key]
+        for shard, part in enumerate(parts):
+            with open(self.shardPath(policy, shard), "wb") as f:
+                pickle.dump((part[0], part[1] if visits is not None else None), f)
+
+    def readShard(self, policy, shard):
+        # Shards are written converted, as (table, visits) tuples, so they load with plain pickle
+        with open(self.shardPath(policy, shard), "rb") as f:
+            return pickle.load(f)
+
+    def __iter__(self):
+        """
+        Yields, for every shard, the (table, visits) of every policy in that shard
+        """
+        for shard in range(self.shards):
+            yield [self.readShard(policy, shard) for policy in range(len(self.paths))]
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def policyParts(paths, shards, tmp=None):
+    """
+    Yields lists of (table, visits) with one item per path, the whole policies or one shard of each at a time
+    """
+    if shards <= 1:
+        yield [(loadPolicy(path), loadVisits(path)) for path in paths]
+        return
+    parts = Shards(paths, shards, tmp)
+    try:
+        for part in parts:
+            yield part
+    finally:
+        parts.close()
+
+
+def describe(values):
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return "none"
+    return "min %.4g  p1 %.4g  p50 %.4g  p99 %.4g  max %.4g  mean %.4g  std %.4g" % (
+        values.min(), np.percentile(values, 1), np.percentile(values, 50), np.percentile(values, 99),
+        values.max(), values.mean(), values.std())
+
+def inspect(args):
+    tracemalloc.start()
+    table = loadPolicy(args.policy)
+    footprint = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    visits = loadVisits(args.policy)
+    values = np.fromiter(table.values(), dtype=float, count=len(table))
+    states = Counter(state for state, action in table)
+    actions = Counter(action for state, action in table)
+    print("file:            ", args.policy, "(%d bytes)" % os.path.getsize(args.policy))
+    print("entries:         ", len(table))
+    print("states:          ", len(states))
+    print("memory:           %d bytes loaded, %.0f per entry" % (footprint, footprint / max(len(table), 1)))
+    print("q-values:        ", describe(values))
+    print("zero entries:    ", int((values == 0).sum()))
+    counts, edges = np.histogram(values, bins=args.bins) if len(values) else ([], [])
+    for count, low, high in zip(counts, edges[:-1], edges[1:]):
+        print("  [%10.4g, %10.4g)  %d" % (low, high, count))
+    print("actions:         ", ", ".join("%s: %d" % (action, actions[action]) for action in sorted(actions)))
+    print("actions/state:   ", ", ".join("%d: %d" % item for item in sorted(Counter(states.values()).items())))
+    decoded = [decodeState(state) for state in states]
+    print("mazes:           ", ", ".join("%d: %d states" % item for item in sorted(Counter(d[0] for d in decoded).items())))
+    print("pacman nodes:    ", len(set((d[0], d[1]) for d in decoded)))
+    modes = Counter(d[4] for d in decoded).most_common(args.top)
+    print("ghost modes:     ", ", ".join("%s: %d" % item for item in modes))
+    if visits is not None:
+        print("visits:          ", describe(list(visits.values())))
+
+def mergePart(part, weights, mode):
+    """
+    Merges one (table, visits) per policy into a table and its visits
+    """
+    merged = {}
+    mergedVisits = {}
+    keys = set()
+    for table, visits in part:
+        keys.update(table)
+    for key in keys:
+        total = 0.0
+        weight = 0.0
+        best = None
+        count = 0
+        for (table, visits), w in zip(part, weights):
+            if key not in table:
+                continue
+            n = visits.get(key, 1) if visits is not None else 1
+            count += n
+            total += w * table[key]
+            weight += w
+            if best is None or n > best[0]:
+                best = (n, table[key])
+        if mode == "maxvisit":
+            merged[key] = best[1]
+        else:
+            merged[key] = total / weight if weight != 0 else 0.0
+        mergedVisits[key] = count
+    return merged, mergedVisits
+
+def merge(args):
+    weights = args.weights or [1.0] * len(args.policies)
+    if len(weights) != len(args.policies):
+        raise SystemExit("give one weight per policy")
+    writer = PolicyWriter(args.output)
+    visitWriter = PolicyWriter(args.output + ".visits")
+    for part in policyParts(args.policies, args.shards, args.tmp):
+        merged, visits = mergePart(part, weights, args.mode)
+        writeSorted(writer, merged)
+        writeSorted(visitWriter, visits)
+    writer.close()
+    visitWriter.close()
+    print("merged %d policies into %s: %d entries" % (len(args.policies), args.output, writer.count))
+
+def prune(args):
+    table = loadPolicy(args.policy)
+    visits = loadVisits(args.policy)
+    writer = PolicyWriter(args.output)
+    visitWriter = PolicyWriter(args.output + ".visits") if visits is not None else None
+    removed = 0
+    for key in sorted(table, key=lambda key: (hash(key[0]), key[1])):
+        value = table[key]
+        n = visits.get(key, 0) if visits is not None else None
+        if abs(value) <= args.zero or (n is not None and n < args.min_visits):
+            removed += 1
+            continue
+        writer.write(key, value)
+        if visitWriter is not None:
+            visitWriter.write(key, n)
+    writer.close()
+    if visitWriter is not None:
+        visitWriter.close()
+    print("kept %d entries, pruned %d" % (writer.count, removed))
+
+def greedyActions(table):
+    best = {}
+    for (state, action), value in table.items():
+        if state not in best or value > best[state][0]:
+            best[state] = (value, action)
+    return best
+
+def diff(args):
+    onlyA = onlyB = changed = 0
+    differences = []
+    agree = shared = 0
+    for (a, visitsA), (b, visitsB) in policyParts([args.a, args.b], args.shards, args.tmp):
+        for key, value in a.items():
+            if key not in b:
+                onlyA += 1
+                continue
+            difference = b[key] - value
+            differences.append(difference)
+            if abs(difference) > args.tolerance:
+                changed += 1
+        onlyB += sum(1 for key in b if key not in a)
+        bestA = greedyActions(a)
+        bestB = greedyActions(b)
+        for state, (value, action) in bestA.items():
+            if state in bestB:
+                shared += 1
+                agree += bestB[state][1] == action
+    differences = np.array(differences)
+    print("only in %s: %d" % (args.a, onlyA))
+    print("only in %s: %d" % (args.b, onlyB))
+    print("in both:    %d, changed by more than %g: %d" % (len(differences), args.tolerance, changed))
+    if len(differences):
+        print("difference: ", describe(differences))
+        print("mean |diff|:", np.abs(differences).mean())
+    if shared:
+        print("greedy action agrees on %d of %d shared states (%.1f%%)" % (agree, shared, 100.0 * agree / shared))
+
+def convert(args):
+    table = loadPolicy(args.policy)
+    visits = loadVisits(args.policy)
+    writer = PolicyWriter(args.output)
+    writeSorted(writer, table)
+    writer.close()
+    if visits is not None:
+        visitWriter = PolicyWriter(args.output + ".visits")
+        writeSorted(visitWriter, visits)
+        visitWriter.close()
+    print("converted %s into %s: %d entries" % (args.policy, args.output, writer.count))
+
+def freeze(args):
+    frozen = FrozenPolicy.fromQTable(loadPolicy(args.policy))
+    frozen.save(args.output)
+    print("froze %d states into %s (%d bytes)" % (len(frozen), args.output, os.path.getsize(args.output)))
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Inspects, merges, prunes, diffs, converts and freezes Q-table policy files",
+                                     epilog="Every input policy is loaded whole, so each one has to fit in memory on its own. "
+                                            "--shards keeps merge and diff to one policy, or one shard of every policy, at a time.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("inspect", help="report size, memory, Q-value and state distributions of a policy")
+    command.add_argument("policy")
+    command.add_argument("--bins", type=int, default=10, help="bins of the Q-value histogram")
+    command.add_argument("--top", type=int, default=5, help="most common ghost mode combinations shown")
+
+    command = commands.add_parser("merge", help="merge policies into one")
+    command.add_argument("output")
+    command.add_argument("policies", nargs="+")
+    command.add_argument("--mode", choices=["mean", "maxvisit"], default="mean",
+                         help="weighted mean of the values, or the value of the policy that visited the entry most")
+    command.add_argument("--weights", type=float, nargs="+", help="weight of each policy in the mean")
+    command.add_argument("--shards", type=int, default=1, help="process the policies in this many parts, so only one whole policy is in memory at a time")
+    command.add_argument("--tmp", help="directory for the shard files")
+
+    command = commands.add_parser("prune", help="drop zero and rarely visited entries")
+    command.add_argument("policy")
+    command.add_argument("output")
+    command.add_argument("--zero", type=float, default=0.0, help="drop entries with |value| up to this")
+    command.add_argument("--min-visits", type=int, default=0, help="drop entries visited fewer times, needs a .visits file")
+
+    command = commands.add_parser("diff", help="compare two policies")
+    command.add_argument("a")
+    command.add_argument("b")
+    command.add_argument("--tolerance", type=float, default=1e-9, help="smallest difference counted as a change")
+    command.add_argument("--shards", type=int, default=1, help="process the policies in this many parts, so only one whole policy is in memory at a time")
+    command.add_argument("--tmp", help="directory for the shard files")
+
+    command = commands.add_parser("convert", help="write a policy saved with tuple states to a new file with packed states, "
+                                  "states that fit no maze are dropped and states that fit both are kept for both")
+    command.add_argument("policy")
+    command.add_argument("output", help="file to write, the policy itself is left as is")
+
+    command = commands.add_parser("freeze", help="export the greedy actions as a compact read-only policy for GameController.loadFrozenPolicy")
+    command.add_argument("policy")
+    command.add_argument("output", help=".npz file to write")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parseArgs(argv)
+    {"inspect": inspect, "merge": merge, "prune": prune, "diff": diff, "convert": convert, "freeze": freeze}[args.command](args)
+    return 0
+
+
+if __name__ == "__main__":
+    # e.g. "python policytool.py merge policies/merged.pkl policies/a.pkl policies/b.pkl --shards 16"
+    sys.exit(main())
@@ -0,0 +1,247 @@
+import sys
+import json
+import time
+import atexit
+import signal
+import threading
+import traceback
+import numpy as np
+
+# Upper edges of the histogram buckets in seconds, from 1 microsecond doubling up to about 1 second
+BUCKETS = [1e-6 * 2**i for i in range(21)]
+
+class NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULLPHASE = NullPhase()
+
+
+class NullProfiler(object):
+    """
+    Records nothing, so instrumented code costs next to nothing while profiling is disabled
+    """
+    enabled = False
+
+    def phase(self, name):
+        return NULLPHASE
+
+    def beginFrame(self):
+        pass
+
+    def endFrame(self):
+        pass
+
+NULLPROFILER = NullProfiler()
+
+
+class RollingHistogram(object):
+    """
+    Keeps the last size samples of a phase, and the frames they were taken in
+    """
+    def __init__(self, size):
+        self.samples = np.zeros(size)
+        self.frames = np.zeros(size, dtype=np.int64)
+        self.size = size
+        self.index = 0
+        self.count = 0
+
+    def add(self, value, frame=0):
+        self.samples[self.index] = value
+        self.frames[self.index] = frame
+        self.index = (self.index + 1) % self.size
+        self.count += 1
+
+    def values(self):
+        return self.samples[:min(self.count, self.size)]
+
+    def sumSince(self, frame):
+        """
+        Returns the sum of the samples taken in frame or later
+        """
+        n = min(self.count, self.size)
+        return self.samples[:n][self.frames[:n] >= frame].sum()
+
+    def histogram(self):
+        counts, edges = np.histogram(self.values(), bins=[0] + BUCKETS + [np.inf])
+        return counts
+
+
+class Phase(object):
+    def __init__(self, profiler, name, window):
+        self.profiler = profiler
+        self.name = name
+        self.histogram = RollingHistogram(window)
+        self.frameTime = 0
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.profiler.active.append(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        if self.frameTime == 0:
+            self.profiler.touched.append(self)
+        self.frameTime += time.perf_counter() - self.start
+        self.profiler.active.pop()
+        return False
+
+
+class PhaseProfiler(object):
+    """
+    Records the time spent in each phase of a frame into rolling histograms of the last window frames
+
+    Nested phases are timed separately, the parent's time includes its children.
+    Frames in which a phase did not run are not counted for that phase, but its share of the
+    frame time is taken over the frames of the frame time's window, the same for every phase.
+    """
+    enabled = True
+
+    def __init__(self, window=3000):
+        self.window = window
+        self.phases = {}
+        self.frame = Phase(self, "frame", window)
+        self.active = []
+        self.touched = []
+        self.frames = 0
+        self.listeners = []
+
+    def phase(self, name):
+        if name not in self.phases:
+            self.phases[name] = Phase(self, name, self.window)
+        return self.phases[name]
+
+    def beginFrame(self):
+        self.frame.__enter__()
+
+    def endFrame(self):
+        self.frame.__exit__()
+        for listener in self.listeners:
+            listener.frameEnded(self)
+        for phase in self.touched:
+            phase.histogram.add(phase.frameTime, self.frames)
+            phase.frameTime = 0
+        self.touched = []
+        self.frames += 1
+
+    def addListener(self, listener):
+        """
+        Adds an object whose frameEnded(profiler) is called at the end of every frame, while the frame's phase times are still set
+        """
+        self.listeners.append(listener)
+
+    def report(self):
+        """
+        Returns a table of per-frame phase times in milliseconds over the window
+        """
+        frameTotal = self.frame.histogram.values().sum()
+        firstFrame = self.frames - min(self.frame.histogram.count, self.window) # First frame of the frame time's window
+        lines = ["frames: %d, window: %d" % (self.frames, self.window),
+                 "%-26s %7s %9s %9s %9s %9s %7s" % ("phase", "frames", "mean ms", "p50 ms", "p99 ms", "max ms", "share")]
+        for phase in [self.frame] + sorted(self.phases.values(), key=lambda phase: phase.name):
+            values = phase.histogram.values()
+            if len(values) == 0:
+                continue
+            share = phase.histogram.sumSince(firstFrame) / frameTotal if frameTotal else 0
+            lines.append("%-26s %7d %9.4f %9.4f %9.4f %9.4f %6.1f%%" % (phase.name, len(values), values.mean()*1000,
+                         np.percentile(values, 50)*1000, np.percentile(values, 99)*1000, values.max()*1000, share*100))
+        lines.append("histogram bucket upper edges (ms): " + " ".join("%g" % (edge*1000) for edge in BUCKETS) + " inf")
+        for phase in [self.frame] + sorted(self.phases.values(), key=lambda phase: phase.name):
+            if phase.histogram.count:
+                lines.append("%-26s %s" % (phase.name, " ".join(str(count) for count in phase.histogram.histogram())))
+        return "\n".join(lines)
+
+    def dump(self, path=None):
+        """
+        Appends the report to the file at path, or writes it to stderr
+        """
+        text = time.strftime("%Y-%m-%d %H:%M:%S") + "\n" + self.report() + "\n\n"
+        if path is None:
+            sys.stderr.write(text)
+        else:
+            with open(path, "a") as f:
+                f.write(text)
+
+    def dumpOnExit(self, path=None):
+        """
+        Dumps the report when the process exits and whenever it receives SIGUSR1
+        """
+        atexit.register(self.dump, path)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.dump(path))
+
+
+class FrameMonitor(object):
+    """
+    Writes every frame that takes longer than budget seconds to a hitch log
+
+    Each entry holds the frame's slowest phases and stack samples of the game thread. The samples
+    are taken by a watchdog thread once the running frame is over budget, so they show where the
+    frame was stuck. The log has one JSON object per line.
+    """
+    def __init__(self, profiler, budget=1.0/30, path="hitches.log", stackDepth=12, maxSamples=8):
+        self.profiler = profiler
+        self.budget = budget
+        self.path = path
+        self.stackDepth = stackDepth
+        self.maxSamples = maxSamples
+        self.threadId = threading.get_ident() # The thread running the game
+        self.interval = min(budget / 4.0, 0.005)
+        self.samples = []
+        self.lock = threading.Lock() # Guards samples, which the watchdog adds to and frameEnded takes
+        self.hitches = 0
+        self.running = True
+        profiler.addListener(self)
+        self.watchdog = threading.Thread(target=self.watch, daemon=True)
+        self.watchdog.start()
+
+    def watch(self):
+        while self.running:
+            time.sleep(self.interval)
+            frame = self.profiler.frames
+            active = list(self.profiler.active)
+            elapsed = time.perf_counter() - self.profiler.frame.start
+            if len(active) > 0 and elapsed > self.budget and len(self.samples) < self.maxSamples:
+                stack = sys._current_frames().get(self.threadId)
+                if stack is not None:
+                    lines = ["%s:%d %s" % (entry.filename, entry.lineno, entry.name)
+                             for entry in traceback.extract_stack(stack, self.stackDepth)]
+                    with self.lock:
+                        self.samples.append((frame, elapsed, active[1:], lines))
+
+    def frameEnded(self, profiler):
+        frame = profiler.frames
+        with self.lock:
+            taken = [sample for sample in self.samples if sample[0] <= frame]
+            self.samples = [sample for sample in self.samples if sample[0] > frame] # Already of the next frame
+        samples = []
+        for f, elapsed, active, lines in taken:
+            if f != frame:
+                continue
+            # Consecutive identical samples are merged, the frame was stuck in the same place
+            if len(samples) > 0 and samples[-1]["phases"] == active and samples[-1]["stack"] == lines:
+                samples[-1]["count"] += 1
+            else:
+                samples.append({"atMs": elapsed * 1000, "count": 1, "phases": active, "stack": lines})
+        duration = profiler.frame.frameTime
+        if duration <= self.budget:
+            return
+        self.hitches += 1
+        phases = sorted(profiler.touched, key=lambda phase: phase.frameTime, reverse=True)
+        entry = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "frame": frame,
+            "durationMs": duration * 1000,
+            "budgetMs": self.budget * 1000,
+            "phases": dict((phase.name, phase.frameTime * 1000) for phase in phases if phase is not profiler.frame),
+            "samples": samples,
+        }
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def stop(self):
+        self.running = False
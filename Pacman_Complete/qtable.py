@@ -0,0 +1,244 @@
+import sys
+import numpy as np
+from constants import *
+
+ACTIONS = [UP, DOWN, LEFT, RIGHT] # Column order of actions in action masks and Q arrays
+
+def actionMask(actions):
+    mask = 0
+    for action in actions:
+        mask |= 1 << ACTIONS.index(action)
+    return mask
+
+def actionColumns(actions):
+    """
+    Returns the Q array columns of an array of directions, which must all be in ACTIONS
+    """
+    columns = np.full(5, -1, dtype=np.int64) # STOP has no column
+    for column, action in enumerate(ACTIONS):
+        columns[action + 2] = column # Directions run from -2 to 2
+    result = columns[np.asarray(actions, dtype=np.int64) + 2]
+    if (result < 0).any():
+        raise ValueError("actions without a Q array column: %s" % sorted(set(np.asarray(actions)[result < 0].tolist())))
+    return result
+
+
+class ArrayQTable(object):
+    """
+    Q-values in a (states, actions) array, states get dense integer ids in the order they are first seen
+
+    known marks the entries that a dict Q-table as used by Pacman would hold.
+    """
+    def __init__(self, capacity=1024):
+        self.ids = {}
+        self.states = []
+        self.q = np.zeros((capacity, len(ACTIONS)))
+        self.known = np.zeros((capacity, len(ACTIONS)), dtype=np.bool_)
+
+    def stateId(self, state, q_table=None):
+        """
+        Returns the id of state, a new state starts from its values in q_table if given
+        """
+        i = self.ids.get(state)
+        if i is None:
+            i = len(self.states)
+            self.ids[state] = i
+            self.states.append(state)
+            self.grow(i + 1)
+            if q_table is not None:
+                for column, action in enumerate(ACTIONS):
+                    value = q_table.get((state, action))
+                    if value is not None:
+                        self.q[i, column] = value
+                        self.known[i, column] = True
+        return i
+
+    def grow(self, size):
+        if size > len(self.q):
+            capacity = max(size, 2 * len(self.q))
+            self.q = np.concatenate([self.q, np.zeros((capacity - len(self.q), len(ACTIONS)))])
+            self.known = np.concatenate([self.known, np.zeros((capacity - len(self.known), len(ACTIONS)), dtype=np.bool_)])
+
+    def loadPolicy(self, q_table):
+        for state, action in q_table:
+            self.stateId(state, q_table)
+
+    def update(self, s, a, rewards, s2, dones, nextMasks, alpha, gamma):
+        """
+        Applies one synchronous Q-update to a batch of transitions given as state ids and action columns
+
+        Every (state, action) in the batch moves alpha of the way towards the mean of its targets,
+        computed from the values before the batch. Returns the flat indices of the updated entries.
+        """
+        valid = (nextMasks[:, None] >> np.arange(len(ACTIONS))) & 1 == 1
+        future = np.where(valid, self.q[s2], -np.inf).max(axis=1)
+        future = np.where(dones | ~valid.any(axis=1), 0.0, future)
+        targets = rewards + gamma * future
+        # Average the errors of repeated (state, action) pairs, then scatter them into the table
+        flat = s * len(ACTIONS) + a
+        pairs, inverse = np.unique(flat, return_inverse=True)
+        errors = np.bincount(inverse, weights=targets - self.q[s, a])
+        counts = np.bincount(inverse)
+        self.q.reshape(-1)[pairs] += alpha * errors / counts
+        self.known[s, a] = True
+        np.logical_or.at(self.known, s2, valid)
+        return pairs
+
+    def writeBack(self, pairs, q_table):
+        """
+        Copies the entries at the given flat indices into a dict Q-table
+        """
+        values = self.q.reshape(-1)[pairs]
+        for pair, value in zip(pairs.tolist(), values.tolist()):
+            i, column = divmod(pair, len(ACTIONS))
+            q_table[(self.states[i], ACTIONS[column])] = value
+
+    def toPolicy(self, q_table=None):
+        """
+        Returns the known entries as a dict Q-table, or copies them into q_table
+        """
+        if q_table is None:
+            q_table = {}
+        rows, columns = np.nonzero(self.known[:len(self.states)])
+        for i, column, value in zip(rows.tolist(), columns.tolist(), self.q[rows, columns].tolist()):
+            q_table[(self.states[i], ACTIONS[column])] = value
+        return q_table
+
+
+DICTSLOTBYTES = 104 # Hash table share of one dict entry, counted for both the table and the visits
+STATESHARING = 3 # Keys of the actions of a state share the state tuple, about 3 per state
+
+def entrySize(key, value):
+    """
+    Estimates the bytes one (state, action) entry of a bounded table takes up, with its visit count
+    """
+    state, action = key
+    return (sys.getsizeof(key) + deepSize(state) // STATESHARING + deepSize(action) + sys.getsizeof(value)
+            + sys.getsizeof(1) + 2 * DICTSLOTBYTES + 8)
+
+def deepSize(value):
+    """
+    Returns the bytes held by value, counting the items of nested tuples
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, tuple):
+        size += sum(deepSize(item) for item in value)
+    return size
+
+
+class BoundedQTable(dict):
+    """
+    A Q-table that holds at most capacity entries, evicting rarely updated, near-zero entries first
+
+    Every write counts as a visit. When the table is full, a CLOCK hand sweeps the entries in
+    insertion order: an entry with at most minVisits visits or a value within nearZero of 0 is
+    evicted, any other entry has its visits halved and gets a second chance. With memoryLimit set,
+    the capacity is lowered so the estimated footprint stays under memoryLimit bytes.
+
+    It pickles as a plain dict, so saved policies load without it.
+    """
+    def __init__(self, data=None, capacity=None, memoryLimit=None, visits=None, minVisits=1, nearZero=1e-3):
+        dict.__init__(self)
+        self.capacity = capacity
+        self.memoryLimit = memoryLimit
+        self.minVisits = minVisits
+        self.nearZero = nearZero
+        self.visits = {}
+        self.ring = [] # Keys in CLOCK order, slots of deleted keys are reused by the hand
+        self.hand = 0
+        self.evictions = 0
+        self.sweeps = 0 # Entries the hand passed over
+        self.entryBytes = None
+        if data:
+            visits = visits or {}
+            items = list(data.items())
+            limit = self.limit(items[0])
+            if limit is not None and len(items) > limit:
+                # Keep the most visited entries, then those furthest from 0
+                items.sort(key=lambda item: (visits.get(item[0], 0), abs(item[1])), reverse=True)
+                items = items[:limit]
+            for key, value in items:
+                self[key] = value
+                self.visits[key] = visits.get(key, 1)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+    def limit(self, item=None):
+        """
+        Returns the number of entries the table may hold, or None without a limit
+
+        The bytes per entry are estimated from the first entry, or from item.
+        """
+        if self.memoryLimit is None:
+            return self.capacity
+        if self.entryBytes is None:
+            if item is None:
+                return self.capacity
+            self.entryBytes = entrySize(*item)
+        entries = int(self.memoryLimit // self.entryBytes)
+        return entries if self.capacity is None else min(entries, self.capacity)
+
+    def __setitem__(self, key, value):
+        if key in self:
+            dict.__setitem__(self, key, value)
+            self.visits[key] += 1
+            return
+        limit = self.limit((key, value))
+        if limit is not None and len(self) >= limit:
+            self.ring[self.evict()] = key
+        else:
+            self.ring.append(key)
+        dict.__setitem__(self, key, value)
+        self.visits[key] = 1
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        del self.visits[key]
+        self.compact()
+
+    def pop(self, key, *default):
+        if key in self:
+            del self.visits[key]
+        value = dict.pop(self, key, *default)
+        self.compact()
+        return value
+
+    def compact(self):
+        """
+        Drops the slots of deleted keys once they make up half of the ring
+        """
+        if len(self.ring) > 2 * len(self) + 16:
+            self.ring = list(dict.fromkeys(key for key in self.ring if dict.__contains__(self, key)))
+            self.hand = 0
+
+    def evict(self):
+        """
+        Moves the hand to the next entry to evict, removes it and returns its slot in the ring
+        """
+        ring = self.ring
+        while True:
+            if self.hand >= len(ring):
+                self.hand = 0
+            slot = self.hand
+            self.hand += 1
+            self.sweeps += 1
+            key = ring[slot]
+            if not dict.__contains__(self, key):
+                return slot # The key was deleted, the slot is free
+            visits = self.visits[key]
+            if visits <= self.minVisits or abs(dict.__getitem__(self, key)) < self.nearZero:
+                dict.__delitem__(self, key)
+                del self.visits[key]
+                self.evictions += 1
+                return slot
+            self.visits[key] = visits // 2
+
+    def stats(self):
+        return {
+            "entries": len(self),
+            "limit": self.limit(),
+            "evictions": self.evictions,
+            "sweeps": self.sweeps,
+            "estimatedBytes": len(self) * self.entryBytes if self.entryBytes else None,
+        }
@@ -0,0 +1,156 @@
+import sys
+import json
+import atexit
+import struct
+import numpy as np
+
+# A replay is a header followed by records. The header is the magic, a version and the length of
+# a JSON config holding the seed, the random generator states and the game settings. Records are:
+#   DT     run of consecutive frames with the same dt: tag, dt as a double, number of frames
+#   ACTION direction Pacman chose at a node
+#   PAUSE  the player toggled the pause
+# A run of frames is always written out before an action or pause, so records stay in frame order.
+MAGIC = b"PMRP"
+VERSION = 1
+DT = 0
+ACTION = 1
+PAUSE = 2
+HEADER = struct.Struct("<4sBI")
+DTRUN = struct.Struct("<BdI")
+ACTIONRECORD = struct.Struct("<Bb")
+MAXRUN = 0xFFFFFFFF
+
+class ReplayWriter(object):
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb", buffering=65536)
+        self.started = False
+        self.dt = None
+        self.count = 0
+        atexit.register(self.close)
+
+    def start(self, config):
+        data = json.dumps(config).encode("utf-8")
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(data)))
+        self.file.write(data)
+        self.started = True
+
+    def writeDt(self, dt):
+        if dt == self.dt and self.count < MAXRUN:
+            self.count += 1
+        else:
+            self.writeRun()
+            self.dt = dt
+            self.count = 1
+
+    def writeRun(self):
+        if self.count > 0:
+            self.file.write(DTRUN.pack(DT, self.dt, self.count))
+            self.count = 0
+
+    def writeAction(self, direction):
+        self.writeRun()
+        self.file.write(ACTIONRECORD.pack(ACTION, direction))
+
+    def writePause(self):
+        self.writeRun()
+        self.file.write(bytes([PAUSE]))
+
+    def close(self):
+        if self.file is not None:
+            self.writeRun()
+            self.file.close()
+            self.file = None
+
+
+class ReplayReader(object):
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        magic, version, length = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError("not a replay file: " + path)
+        if version != VERSION:
+            raise ValueError("unsupported replay version %d in %s" % (version, path))
+        self.config = json.loads(self.data[HEADER.size:HEADER.size+length].decode("utf-8"))
+        self.offset = HEADER.size + length
+        self.dt = None
+        self.count = 0 # Frames left in the current run
+
+    def nextTag(self):
+        if self.offset < len(self.data):
+            return self.data[self.offset]
+        return None
+
+    def hasFrames(self):
+        return self.count > 0 or self.nextTag() == DT
+
+    def readDt(self):
+        if self.count == 0:
+            if self.nextTag() != DT:
+                raise ValueError("replay out of sync, expected a frame at byte %d" % self.offset)
+            tag, self.dt, self.count = DTRUN.unpack_from(self.data, self.offset)
+            self.offset += DTRUN.size
+        self.count -= 1
+        return self.dt
+
+    def readAction(self):
+        if self.count != 0 or self.nextTag() != ACTION:
+            raise ValueError("replay out of sync, expected an action at byte %d" % self.offset)
+        tag, direction = ACTIONRECORD.unpack_from(self.data, self.offset)
+        self.offset += ACTIONRECORD.size
+        return direction
+
+    def readPause(self):
+        """
+        Returns whether the player toggled the pause in the current frame
+        """
+        if self.count == 0 and self.nextTag() == PAUSE:
+            self.offset += 1
+            return True
+        return False
+
+
+def playReplay(path, render=False):
+    """
+    Re-simulates a recorded game and returns the GameController at the end of the replay
+
+    Without render it runs headless as fast as possible, with render it draws every frame at 30 FPS
+    """
+    from run import GameController
+    reader = ReplayReader(path)
+    config = reader.config
+    game = GameController(np.random.SeedSequence(config["seed"]["entropy"], spawn_key=config["seed"]["spawnKey"]), headless=not render)
+    game.pacmanRNG.bit_generator.state = config["rng"]["pacman"]
+    game.ghostRNG.bit_generator.state = config["rng"]["ghosts"]
+    game.speedModifier = config["speedModifier"]
+    game.level = config["level"]
+    game.lives = config["lives"]
+    game.score = config["score"]
+    game.setEpisodes(config["episodes"])
+    game.setRunUntilWin(config["runUntilWin"])
+    game.setEventDriven(config.get("eventDriven", False)) # The frame lengths still come from the replay
+    game.setSubstepping(config.get("substepDistance"))
+    game.setLearning(False) # The actions come from the replay, and the policy file must not change
+    game.setRenderInterval(1 if render else 0)
+    game.playback = reader
+    game.startGame()
+    if game.lifesprites is not None:
+        game.lifesprites.resetLives(game.lives)
+    game.textgroup.updateScore(game.score)
+    game.textgroup.updateLevel(game.level)
+    game.pause.paused = config["paused"]
+    try:
+        while reader.hasFrames():
+            if render:
+                game.clock.tick(30)
+            game.update()
+    except SystemExit:
+        pass # The recorded game ran out of episodes here as well
+    return game
+
+
+if __name__ == "__main__":
+    # e.g. "python replay.py replays/death.rpl --render"
+    game = playReplay(sys.argv[1], "--render" in sys.argv[2:])
+    print("LEVEL: ", game.level, "SCORE: ", game.score, "LIVES: ", game.lives)
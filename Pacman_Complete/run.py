@@ -1,5 +1,6 @@
-import pygame
-from pygame.locals import *
+import time
+import math
+import numpy as np
 from constants import *
 from pacman import Pacman
 from nodes import NodeGroup
@@ -8,36 +9,84 @@ from ghosts import GhostGroup
 from fruit import Fruit
 from pauser import Pause
 from text import TextGroup
-from sprites import LifeSprites
-from sprites import MazeSprites
 from mazedata import MazeData
+from snapshot import SnapshotWriter
+from profiler import NULLPROFILER, PhaseProfiler, FrameMonitor
+from replay import ReplayWriter
+from transitions import TransitionLogger
+from experience import ExperienceReplay
+from agents import LinearAgent
+from dyna import DynaPlanner
+from frozenpolicy import FrozenPolicy
+from events import EventClock
+from scheduler import Scheduler
+from level import Level, LevelLoader
 
 class GameController(object):
-    def __init__(self):
-        pygame.init()
-        self.screen = pygame.display.set_mode(SCREENSIZE, 0, 32)
+    def __init__(self, seed=None, headless=False):
+        self.headless = headless # Simulates without pygame: no window, sprites, text, keyboard or clock
+        self.screen = None
         self.background = None
         self.background_norm = None
         self.background_flash = None
-        self.clock = pygame.time.Clock()
+        self.clock = None
+        self.timers = Scheduler() # Runs on, paused or not: pauses, texts and flashing
+        self.gameTimers = Scheduler() # Stands still while the game is paused: ghost modes and the fruit
         self.fruit = None
-        self.pause = Pause(True)
+        self.pause = Pause(self.timers, not headless) # A headless game has no keyboard to unpause it with
         self.level = 0
         self.lives = 5
         self.score = 0
-        self.textgroup = TextGroup()
-        self.lifesprites = LifeSprites(self.lives)
+        self.textgroup = TextGroup(self.timers)
+        self.lifesprites = None
         self.flashBG = False
+        self.flashShown = False # Whether background_flash is showing
         self.flashTime = 0.2
-        self.flashTimer = 0
+        self.flashTimer = None
         self.fruitCaptured = []
         self.fruitNode = None
         self.mazedata = MazeData()
+        self.levels = {} # Level of every maze played so far by maze index, reset in place when played again
+        self.preloading = True # Whether the next level is built while the last one is cleared, see setPreloading
+        self.loader = None # Builds the next level in a thread, see preloadLevel
         self.episodes = 0 # Episodes here to keep track of it during learning
         self.speedModifier = 1 # Speed modifier to speed up the game
         self.episilon = 0.9 # qlearn parameter
         self.learning = False # whether to learn or not
         self.runUntilWin = False
+        self.renderInterval = 1 # Render every Nth frame, 0 never renders
+        self.renderFPS = None # Target wall-clock render rate, takes precedence over renderInterval when set
+        self.fixedTimestep = None # Simulate with a fixed dt instead of the 30 FPS clock, so the simulation is not capped
+        self.eventClock = None # Steps straight to the next event instead, see setEventDriven
+        self.substepDistance = None # Most pixels an entity moves per simulation step, see setSubstepping
+        self.frame = 0
+        self.lastRenderTime = 0
+        self.snapshot = None # Publishes the game state to shared memory for a viewer process
+        self.profiler = NULLPROFILER # Times the phases of update, see enableProfiling
+        self.frameMonitor = None # Logs frames over a time budget, see enableHitchLog
+        self.recorder = None # Records the game to a replay file, see recordReplay
+        self.playback = None # Replay the game is re-simulated from, see replay.playReplay
+        self.transitionLog = None # Logs Pacman's learned transitions, see logTransitions
+        self.experience = None # Experience replay Pacman learns through, see enableExperienceReplay
+        self.agent = None # Agent Pacman uses instead of the Q-table, see setAgent
+        self.planner = None # Dyna planner of Pacman's Q-table, see enableDyna
+        self.traceDecay = 0 # Lambda of Watkins Q(lambda) for Pacman, see setTraceDecay
+        self.qCapacity = None # Bounds Pacman's Q-table, see setQTableLimit
+        self.qMemoryLimit = None
+        self.policyFile = "policies/policy2.pkl" # Where the Q-table, or the agent, is loaded from and saved to
+        self.frozenPolicy = None # Greedy policy Pacman plays from instead of the Q-table, see loadFrozenPolicy
+        self.setSeed(seed)
+        if not headless:
+            self.setupDisplay()
+
+    def setupDisplay(self):
+        # pygame is only imported here and where the game draws or reads input, a headless game never loads it
+        import pygame
+        from sprites import LifeSprites
+        pygame.init()
+        self.screen = pygame.display.set_mode(SCREENSIZE, 0, 32)
+        self.clock = pygame.time.Clock()
+        self.lifesprites = LifeSprites(self.lives)
 
     def setEpisodes(self, episodes):
         self.episodes = episodes
@@ -51,33 +100,266 @@ class GameController(object):
     def setRunUntilWin(self, value):
         self.runUntilWin = value
 
-    def setBackground(self):
-        self.background_norm = pygame.surface.Surface(SCREENSIZE).convert()
-        self.background_norm.fill(BLACK)
-        self.background_flash = pygame.surface.Surface(SCREENSIZE).convert()
-        self.background_flash.fill(BLACK)
-        self.background_norm = self.mazesprites.constructBackground(self.background_norm, self.level%5)
-        self.background_flash = self.mazesprites.constructBackground(self.background_flash, 5)
+    def setTraceDecay(self, value):
+        """
+        Makes Pacman learn with Watkins Q(lambda) with lambda value, 0 keeps one-step Q-learning
+
+        Only the tabular Q-table uses traces, not experience replay or an agent.
+        """
+        self.traceDecay = value
+        if hasattr(self, "pacman"):
+            self.pacman.setTraceDecay(value)
+
+    def setQTableLimit(self, capacity=None, memoryLimit=None):
+        """
+        Bounds Pacman's Q-table to capacity entries and about memoryLimit bytes, evicting rarely visited entries, see qtable.BoundedQTable
+        """
+        self.qCapacity = capacity
+        self.qMemoryLimit = memoryLimit
+
+    def setSeed(self, seed):
+        """
+        Seeds all randomness of the game, None seeds from the OS
+
+        Pacman's exploration and the frightened ghosts' moves get independent streams spawned from the seed,
+        so with a fixed timestep the same seed replays the same games. seed can also be a numpy SeedSequence,
+        e.g. one of np.random.SeedSequence(seed).spawn(n) to give parallel games independent reproducible streams.
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed = seed
+        pacmanSeed, ghostSeed, learnSeed = seed.spawn(3)
+        self.pacmanRNG = np.random.default_rng(pacmanSeed)
+        self.ghostRNG = np.random.default_rng(ghostSeed)
+        self.learnRNG = np.random.default_rng(learnSeed) # Sampling in experience replay
+
+    def setRenderInterval(self, interval):
+        """
+        Draws every interval-th frame, 0 never draws
+
+        Unless interval is 1, frames stop waiting on the 30 FPS clock and simulate 1/30 s each as fast as they can, see decimated
+        """
+        self.renderInterval = interval
+
+    def setRenderFPS(self, fps):
+        """
+        Draws at most fps times per wall-clock second, simulating 1/30 s per frame as fast as it can in between
+        """
+        self.renderFPS = fps
+
+    def decimated(self):
+        """
+        Returns whether drawing is decimated, in which case frames simulate a fixed 1/30 s instead of waiting on the clock
+        """
+        return self.renderFPS is not None or self.renderInterval != 1
+
+    def setFixedTimestep(self, dt):
+        self.fixedTimestep = dt
+
+    def setEventDriven(self, eventDriven, maxStep=0.5):
+        """
+        Makes every frame last until the next event, a node reached, a collision, a mode change
+        or a timer running out, which plays like a very small fixed dt in far fewer frames
+        """
+        self.eventClock = EventClock(maxStep) if eventDriven else None
+
+    def setPreloading(self, value):
+        """
+        Makes the next level's node graph and pellets build in a thread during the pause after a level is cleared,
+        so a maze not played before does not stall the game as much when the level starts
+        """
+        self.preloading = value
+
+    def setSubstepping(self, distance):
+        """
+        Splits frames into equal steps in which no entity moves more than distance pixels, None for one step per frame
+
+        Collisions are swept along each step, so nothing passes through anything at any speed,
+        but every node reached still costs the rest of the step, and turns at the nodes are only
+        as precise as the steps are short. This keeps high speedModifiers playing like low ones.
+        """
+        self.substepDistance = distance
+
+    def enableProfiling(self, path=None, window=3000):
+        """
+        Records per-frame phase times of update over the last window frames
+
+        The report is written to path, or stderr, on exit and whenever the process receives SIGUSR1
+        """
+        self.setProfiler(PhaseProfiler(window))
+        self.profiler.dumpOnExit(path)
+
+    def enableHitchLog(self, budget=1.0/30, path="hitches.log"):
+        """
+        Logs every frame whose work takes longer than budget seconds to path, with the phases that ran and stack samples
+        """
+        if not self.profiler.enabled:
+            self.setProfiler(PhaseProfiler())
+        self.frameMonitor = FrameMonitor(self.profiler, budget, path)
+
+    def setProfiler(self, profiler):
+        self.profiler = profiler
+        if hasattr(self, "pacman"):
+            self.pacman.profiler = profiler
+
+    def recordReplay(self, path):
+        """
+        Records the game to a replay file that replay.py re-simulates
+
+        Start recording before the first update after startGame, the replay holds the seed, the game
+        settings, every frame's dt, Pacman's decisions and the player's pauses.
+        """
+        self.recorder = ReplayWriter(path)
+        if hasattr(self, "pacman"):
+            self.pacman.recorder = self.recorder
+
+    def logTransitions(self, directory, chunkSize=100000):
+        """
+        Logs every transition Pacman learns from to chunked NumPy files in directory, for offline training with transitions.py
+        """
+        self.transitionLog = TransitionLogger(directory, chunkSize)
+        if hasattr(self, "pacman"):
+            self.pacman.transitionLog = self.transitionLog
+
+    def enableExperienceReplay(self, capacity=100000, batchSize=32, updatesPerStep=1):
+        """
+        Makes Pacman learn from batches sampled out of a buffer of the last capacity transitions, see experience.py
+        """
+        self.experience = ExperienceReplay(capacity, batchSize, updatesPerStep, self.learnRNG)
+        if hasattr(self, "pacman"):
+            self.pacman.experience = self.experience
+
+    def enableDyna(self, stepsPerUpdate=10, episodeSteps=10000, capacity=200000):
+        """
+        Adds Dyna-Q planning to Pacman's tabular learning
+
+        Every real update is followed by stepsPerUpdate updates replayed from a model of the observed
+        transitions, and every finished episode by another episodeSteps, see dyna.py
+        """
+        self.planner = DynaPlanner(stepsPerUpdate, episodeSteps, capacity, self.learnRNG)
+        if hasattr(self, "pacman"):
+            self.pacman.planner = self.planner
+
+    def loadFrozenPolicy(self, filename):
+        """
+        Makes Pacman play greedily from a frozen policy, made with "python policytool.py freeze", without loading the Q-table
+
+        For playing and evaluating only, the frozen policy does not learn.
+        """
+        self.frozenPolicy = FrozenPolicy.load(filename)
+        if hasattr(self, "pacman"):
+            self.pacman.frozen = self.frozenPolicy
+
+    def setAgent(self, agent, policyFile):
+        """
+        Makes Pacman choose actions and learn through agent, e.g. agents.LinearAgent, which is saved to policyFile
+        """
+        self.agent = agent
+        self.policyFile = policyFile
+        if hasattr(self, "pacman"):
+            self.pacman.agent = agent
+
+    def replayConfig(self):
+        return {
+            "seed": {"entropy": self.seed.entropy, "spawnKey": list(self.seed.spawn_key)},
+            "rng": {"pacman": self.pacmanRNG.bit_generator.state, "ghosts": self.ghostRNG.bit_generator.state},
+            "speedModifier": self.speedModifier,
+            "level": self.level,
+            "lives": self.lives,
+            "score": self.score,
+            "episodes": self.episodes,
+            "runUntilWin": self.runUntilWin,
+            "paused": self.pause.paused,
+            "eventDriven": self.eventClock is not None, # Event-driven games check ghost collisions differently
+            "substepDistance": self.substepDistance,
+        }
+
+    def publishSnapshots(self, name=None):
+        """
+        Publishes a snapshot of the game every frame, which viewer.py can attach to by name
+        """
+        self.snapshot = SnapshotWriter(name)
+        print("PUBLISHING SNAPSHOTS TO: ", self.snapshot.name)
+
+    def setBackground(self, level):
+        if not self.headless:
+            # The backgrounds are kept with the level, a maze is only drawn once in every colour
+            level.drawBackgrounds(self.level%5)
+            self.mazesprites = level.mazesprites
+            self.background_norm = level.backgrounds[self.level%5]
+            self.background_flash = level.background_flash
         self.flashBG = False
+        self.flashShown = False
+        self.timers.cancel(self.flashTimer)
         self.background = self.background_norm
 
+    def startFlash(self):
+        self.flashBG = True
+        self.flashTimer = self.timers.schedule(self.flashTime, self.flashBackground)
+
+    def flashBackground(self):
+        self.flashShown = not self.flashShown
+        self.background = self.background_flash if self.flashShown else self.background_norm
+        self.flashTimer = self.timers.schedule(self.flashTime, self.flashBackground)
+
     def startGame(self):      
+        """
+        Sets up the current level
+
+        Every maze is built once. Playing it again resets its pellets, node access and ghosts in place,
+        and the one Pacman is moved over with his Q-table, which is only loaded from the policy file at the start.
+        """
+        if hasattr(self, "ghosts"):
+            # The last level's pellets and ghosts stop, and their timers with them
+            self.pellets.stopTimers()
+            self.ghosts.stopTimers()
+        if self.loader is not None:
+            # Take over the level built during the pause, waiting for it if the pause was cut short
+            self.levels[self.loader.index] = self.loader.finish()
+            self.loader = None
         self.mazedata.loadMaze(self.level)
-        self.mazesprites = MazeSprites(self.mazedata.obj.name+".txt", self.mazedata.obj.name+"_rotation.txt")
-        self.setBackground()
-        self.nodes = NodeGroup(self.mazedata.obj.name+".txt")
-        self.mazedata.obj.setPortalPairs(self.nodes)
-        self.mazedata.obj.connectHomeNodes(self.nodes)
-        self.pellets = PelletGroup(self.mazedata.obj.name+".txt")
-        self.pacman = Pacman(self.nodes.getNodeFromTiles(*self.mazedata.obj.pacmanStart), self.pellets, self.nodes, self.learning) # Edited to give pacman reference to the pellets and ghosts, and set whether to learn
-        self.ghosts = GhostGroup(self.nodes.getStartTempNode(), self.pacman)
+        mazeIndex = self.level % len(self.mazedata.mazedict)
+        level = self.levels.get(mazeIndex)
+        if level is None:
+            level = self.levels[mazeIndex] = Level(self.mazedata.obj, self.timers)
+        level.pellets.reset()
+        self.setBackground(level)
+        self.nodes = level.nodes
+        self.pellets = level.pellets
+        newPacman = not hasattr(self, "pacman")
+        if newPacman:
+            self.pacman = Pacman(self.nodes.getNodeFromTiles(*self.mazedata.obj.pacmanStart), self.pellets, self.nodes, self.learning, rng=self.pacmanRNG) # Edited to give pacman reference to the pellets and ghosts, and set whether to learn
+        else:
+            self.pacman.restart(self.nodes.getNodeFromTiles(*self.mazedata.obj.pacmanStart))
+            self.pacman.pellets = self.pellets
+            self.pacman.nodes = self.nodes
+            self.pacman.learning = self.learning
+        newGhosts = level.ghosts is None
+        if newGhosts:
+            level.ghosts = GhostGroup(self.nodes.getStartTempNode(), self.pacman, self.gameTimers, self.ghostRNG)
+        else:
+            level.ghosts.restart()
+        self.ghosts = level.ghosts
         self.pacman.ghost_group = self.ghosts
+        if not self.headless:
+            self.addSprites()
+        self.pacman.mazeIndex = mazeIndex
+        self.pacman.profiler = self.profiler
+        self.pacman.recorder = self.recorder
+        self.pacman.playback = self.playback
+        self.pacman.transitionLog = self.transitionLog
+        self.pacman.experience = self.experience
+        self.pacman.agent = self.agent
+        self.pacman.planner = self.planner
+        self.pacman.frozen = self.frozenPolicy
 
         # Set pacman speed modifier, epsilon, and start state
         self.pacman.speedModifier = self.speedModifier
         self.pacman.set_epsilon(self.episilon)
+        self.pacman.setTraceDecay(self.traceDecay)
+        self.pacman.qCapacity = self.qCapacity
+        self.pacman.qMemoryLimit = self.qMemoryLimit
         self.pacman.setSpeed(100)
-        self.pacman.setStartState()
         
         # Set the ghost's speed modifier
         for ghost  in self.ghosts.ghosts:
@@ -85,22 +367,43 @@ class GameController(object):
             ghost.mode.speedModifier = self.speedModifier
             ghost.setSpeed(100)
         
-        # Load the policy between resets of pacman, so that he has the newest q-table available
-        self.pacman.load_policy("policies/policy2.pkl")
+        # Pacman keeps his q-table between levels and episodes, it is only loaded when he is made
+        if newPacman:
+            if self.frozenPolicy is None:
+                self.pacman.load_policy(self.policyFile)
+            if self.experience is not None:
+                self.experience.attach(self.pacman)
+
+        if newGhosts:
+            self.ghosts.pinky.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(2, 3)))
+            self.ghosts.inky.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(0, 3)))
+            self.ghosts.clyde.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(4, 3)))
+            self.ghosts.setSpawnNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(2, 3)))
+            self.ghosts.blinky.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(2, 0)))
+
+            self.nodes.denyHomeAccess(self.pacman)
+            self.nodes.denyHomeAccessList(self.ghosts)
+            self.ghosts.inky.startNode.denyAccess(RIGHT, self.ghosts.inky)
+            self.ghosts.clyde.startNode.denyAccess(LEFT, self.ghosts.clyde)
+            self.mazedata.obj.denyGhostsAccess(self.ghosts, self.nodes)
+            self.nodes.saveAccess()
+        else:
+            # Undo what the last level on this maze opened and closed, e.g. the home for eaten ghosts
+            self.nodes.resetAccess()
 
-        self.ghosts.pinky.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(2, 3)))
-        self.ghosts.inky.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(0, 3)))
-        self.ghosts.clyde.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(4, 3)))
-        self.ghosts.setSpawnNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(2, 3)))
-        self.ghosts.blinky.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(2, 0)))
+        # The start state is taken once the ghosts are at their start nodes
+        self.pacman.setStartState()
 
-        self.nodes.denyHomeAccess(self.pacman)
-        self.nodes.denyHomeAccessList(self.ghosts)
-        self.ghosts.inky.startNode.denyAccess(RIGHT, self.ghosts.inky)
-        self.ghosts.clyde.startNode.denyAccess(LEFT, self.ghosts.clyde)
-        self.mazedata.obj.denyGhostsAccess(self.ghosts, self.nodes)
+    def addSprites(self):
+        from sprites import PacmanSprites, GhostSprites
+        if self.pacman.sprites is None:
+            self.pacman.sprites = PacmanSprites(self.pacman)
+        for ghost in self.ghosts:
+            if ghost.sprites is None:
+                ghost.sprites = GhostSprites(ghost)
 
     def startGame_old(self):      
+        from sprites import MazeSprites
         self.mazedata.loadMaze(self.level)#######
         self.mazesprites = MazeSprites("maze1.txt", "maze1_rotation.txt")
         self.setBackground()
@@ -110,8 +413,8 @@ class GameController(object):
         self.nodes.connectHomeNodes(homekey, (12,14), LEFT)
         self.nodes.connectHomeNodes(homekey, (15,14), RIGHT)
         self.pacman = Pacman(self.nodes.getNodeFromTiles(15, 26))
-        self.pellets = PelletGroup("maze1.txt")
-        self.ghosts = GhostGroup(self.nodes.getStartTempNode(), self.pacman)
+        self.pellets = PelletGroup("maze1.txt", self.timers)
+        self.ghosts = GhostGroup(self.nodes.getStartTempNode(), self.pacman, self.gameTimers)
         self.ghosts.blinky.setStartNode(self.nodes.getNodeFromTiles(2+11.5, 0+14))
         self.ghosts.pinky.setStartNode(self.nodes.getNodeFromTiles(2+11.5, 3+14))
         self.ghosts.inky.setStartNode(self.nodes.getNodeFromTiles(0+11.5, 3+14))
@@ -132,73 +435,138 @@ class GameController(object):
         
 
     def update(self):
-        dt = self.clock.tick(30) / 1000.0
-        self.textgroup.update(dt)
-        self.pellets.update(dt)
+        if self.playback is not None:
+            dt = self.playback.readDt()
+        elif self.eventClock is not None:
+            dt = self.eventClock.nextStep(self)
+        elif self.fixedTimestep is not None:
+            dt = self.fixedTimestep
+        elif self.clock is None:
+            dt = 1.0 / 30 # A headless game has no clock to wait on
+        elif self.decimated():
+            dt = 1.0 / 30 # Frames that are not drawn do not wait on the clock, so the simulation is not capped at 30 FPS
+        else:
+            dt = self.clock.tick(30) / 1000.0
+        if self.recorder is not None:
+            if not self.recorder.started:
+                self.recorder.start(self.replayConfig())
+            self.recorder.writeDt(dt)
+        profiler = self.profiler
+        profiler.beginFrame() # After waiting on the clock, so frame times only hold the frame's work
+        steps = self.substeps(dt)
+        for step in range(steps):
+            self.simulate(dt / steps)
+        with profiler.phase("checkEvents"):
+            self.checkEvents()
+        if self.snapshot is not None:
+            with profiler.phase("snapshot.publish"):
+                self.snapshot.publish(self)
+        if self.shouldRender():
+            with profiler.phase("render"):
+                self.render()
+        profiler.endFrame()
+
+    def substeps(self, dt):
+        """
+        Returns how many steps a frame of dt is simulated in, so no entity moves more than substepDistance in one
+        """
+        if self.substepDistance is None or self.eventClock is not None:
+            return 1
+        speed = max([self.pacman.speed] + [ghost.speed for ghost in self.ghosts])
+        return max(1, int(math.ceil(speed * dt / self.substepDistance)))
+
+    def simulate(self, dt):
+        """
+        Advances the game by dt
+        """
+        profiler = self.profiler
         if not self.pause.paused:
-            self.ghosts.update(dt)      
-            if self.fruit is not None:
-                self.fruit.update(dt)
-            self.checkPelletEvents()
-            self.checkGhostEvents()
-            self.checkFruitEvents()
-
-        if self.pacman.alive:
-            if not self.pause.paused:
+            with profiler.phase("gameTimers.advance"):
+                self.gameTimers.advance(dt)
+            with profiler.phase("ghosts.update"):
+                self.ghosts.update(dt)
+            with profiler.phase("checkPelletEvents"):
+                self.checkPelletEvents()
+            with profiler.phase("checkGhostEvents"):
+                self.checkGhostEvents()
+            with profiler.phase("checkFruitEvents"):
+                self.checkFruitEvents()
+
+        with profiler.phase("pacman.update"):
+            if self.pacman.alive:
+                if not self.pause.paused:
+                    self.pacman.update(dt)
+            else:
                 self.pacman.update(dt)
-        else:
-            self.pacman.update(dt)
-
-        if self.flashBG:
-            self.flashTimer += dt
-            if self.flashTimer >= self.flashTime:
-                self.flashTimer = 0
-                if self.background == self.background_norm:
-                    self.background = self.background_flash
-                else:
-                    self.background = self.background_norm
-
-        afterPauseMethod = self.pause.update(dt)
-        if afterPauseMethod is not None:
-            afterPauseMethod()
-        self.checkEvents()
-        self.render()
+
+        with profiler.phase("timers.advance"):
+            self.timers.advance(dt) # Last, as pauses set in this frame already count it
+
+    def shouldRender(self):
+        """
+        Returns whether the current frame should be drawn
+
+        The simulation runs every frame, but drawing only happens every renderInterval frames,
+        or at most renderFPS times per wall-clock second if a target FPS is set
+        """
+        self.frame += 1
+        if self.headless:
+            return False
+        if self.renderFPS is not None:
+            now = time.perf_counter()
+            if now - self.lastRenderTime >= 1.0 / self.renderFPS:
+                self.lastRenderTime = now
+                return True
+            return False
+        if self.renderInterval <= 0:
+            return False
+        return self.frame % self.renderInterval == 0
 
     def checkEvents(self):
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                exit()
-            elif event.type == KEYDOWN:
-                if event.key == K_SPACE:
-                    if self.pacman.alive:
-                        self.pause.setPause(playerPaused=True)
-                        if not self.pause.paused:
-                            self.textgroup.hideText()
-                            self.showEntities()
-                        else:
-                            self.textgroup.showText(PAUSETXT)
-                            #self.hideEntities()
+        if not self.headless:
+            import pygame
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    exit()
+                elif event.type == pygame.KEYDOWN and self.playback is None:
+                    if event.key == pygame.K_SPACE:
+                        self.togglePause()
+        if self.playback is not None and self.playback.readPause():
+            self.togglePause()
+
+    def togglePause(self):
+        if self.recorder is not None:
+            self.recorder.writePause()
+        if self.pacman.alive:
+            self.pause.setPause(playerPaused=True)
+            if not self.pause.paused:
+                self.textgroup.hideText()
+                self.showEntities()
+            else:
+                self.textgroup.showText(PAUSETXT)
+                #self.hideEntities()
 
     def checkPelletEvents(self):
-        pellet = self.pacman.eatPellets(self.pellets.pelletList)
-        if pellet:
+        # Eat every pellet Pacman passed, a fast Pacman can pass a pellet between the ends of two frames
+        for pellet in self.pacman.sweepPellets(self.pellets):
             self.pellets.numEaten += 1
             self.updateScore(pellet.points)
             if self.pellets.numEaten == 30:
                 self.ghosts.inky.startNode.allowAccess(RIGHT, self.ghosts.inky)
             if self.pellets.numEaten == 70:
                 self.ghosts.clyde.startNode.allowAccess(LEFT, self.ghosts.clyde)
-            self.pellets.pelletList.remove(pellet)
+            self.pellets.removePellet(pellet)
             if pellet.name == POWERPELLET:
                 self.ghosts.startFreight()
             if self.pellets.isEmpty():
-                self.flashBG = True
+                self.startFlash()
                 self.hideEntities()
                 self.pause.setPause(pauseTime=3, func=self.nextLevel)
+                self.preloadLevel(self.level + 1)
 
     def checkGhostEvents(self):
         for ghost in self.ghosts:
-            if self.pacman.collideGhost(ghost):
+            if self.collided(ghost):
                 if ghost.mode.current is FREIGHT:
                     self.pacman.incrementReward(500)
                     self.pacman.visible = False
@@ -212,7 +580,8 @@ class GameController(object):
                 elif ghost.mode.current is not SPAWN:
                     if self.pacman.alive:
                         self.lives -=  1
-                        self.lifesprites.removeImage()
+                        if self.lifesprites is not None:
+                            self.lifesprites.removeImage()
                         self.pacman.die()               
                         self.ghosts.hide()
                         if self.lives <= 0:
@@ -223,22 +592,35 @@ class GameController(object):
                             #self.pause.setPause(pauseTime=3, func=self.resetLevel)
                             self.resetLevel()
     
+    def collided(self, ghost):
+        """
+        Returns whether Pacman ran into ghost, anywhere along their moves so they cannot pass through each other
+        """
+        if self.eventClock is not None:
+            # Event-driven frames stop before contacts, and differ in length, which sweptCollide needs to be equal
+            return self.pacman.collideGhost(ghost)
+        return self.pacman.sweptCollide(ghost)
+
     def checkFruitEvents(self):
         if self.pellets.numEaten == 50 or self.pellets.numEaten == 140:
             if self.fruit is None:
-                self.fruit = Fruit(self.nodes.getNodeFromTiles(9, 20), self.level)
+                self.fruit = Fruit(self.nodes.getNodeFromTiles(9, 20), self.gameTimers, self.level)
+                if not self.headless:
+                    from sprites import FruitSprites
+                    self.fruit.sprites = FruitSprites(self.fruit, self.level)
                 #print(self.fruit)
         if self.fruit is not None:
-            if self.pacman.collideCheck(self.fruit):
+            if self.pacman.sweptCollide(self.fruit):
                 self.updateScore(self.fruit.points)
                 self.textgroup.addText(str(self.fruit.points), WHITE, self.fruit.position.x, self.fruit.position.y, 8, time=1)
-                fruitCaptured = False
-                for fruit in self.fruitCaptured:
-                    if fruit.get_offset() == self.fruit.image.get_offset():
-                        fruitCaptured = True
-                        break
-                if not fruitCaptured:
-                    self.fruitCaptured.append(self.fruit.image)
+                if not self.headless:
+                    fruitCaptured = False
+                    for fruit in self.fruitCaptured:
+                        if fruit.get_offset() == self.fruit.image.get_offset():
+                            fruitCaptured = True
+                            break
+                    if not fruitCaptured:
+                        self.fruitCaptured.append(self.fruit.image)
                 self.fruit = None
             elif self.fruit.destroy:
                 self.fruit = None
@@ -251,6 +633,17 @@ class GameController(object):
         self.pacman.visible = False
         self.ghosts.hide()
 
+    def preloadLevel(self, number):
+        """
+        Starts building the maze of level number in a thread, startGame takes the level over from it and draws the background
+        """
+        if not self.preloading or self.loader is not None:
+            return
+        mazeIndex = number % len(self.mazedata.mazedict)
+        if mazeIndex in self.levels:
+            return # Built already
+        self.loader = LevelLoader(mazeIndex, self.mazedata.mazedict[mazeIndex](), self.timers)
+
     def nextLevel(self):
         print(f"OMG COMPLETED LVL {self.level}") # Just to notify whether a level was completed or not
         self.showEntities()
@@ -269,9 +662,13 @@ class GameController(object):
         self.fruit = None
 
         # If we are learning, save the policy and decrease the epsilon parameter
-        # startGame() resets the pacman object, and thus we have to save the policy and load it again after each episode
+        # Pacman keeps his q-table through startGame(), the policy is saved so that every episode is kept on disk
         if self.pacman.learning:
-            self.pacman.save_policy("policies/policy2.pkl") 
+            if self.planner is not None:
+                self.planner.plan(self.pacman.q_table, self.pacman.alpha, self.pacman.gamma, self.planner.episodeSteps)
+            self.pacman.save_policy(self.policyFile) 
+            if hasattr(self.pacman.q_table, "stats"):
+                print("Q-TABLE: ", self.pacman.q_table.stats())
             self.pacman.decay_epsilon() # Decrease epsilon after each episode
             self.episilon = self.pacman.epsilon
 
@@ -280,7 +677,8 @@ class GameController(object):
         self.textgroup.updateScore(self.score)
         self.textgroup.updateLevel(self.level)
         self.textgroup.showText(READYTXT)
-        self.lifesprites.resetLives(self.lives)
+        if self.lifesprites is not None:
+            self.lifesprites.resetLives(self.lives)
         self.fruitCaptured = []
         if self.episodes > 0: # If there are episodes left, restart the game
             self.episodes -= 1 # Decrement episodes after a game
@@ -309,6 +707,7 @@ class GameController(object):
         self.textgroup.updateScore(self.score)
 
     def render(self):
+        import pygame
         self.screen.blit(self.background, (0, 0))
         #self.nodes.render(self.screen)
         self.pellets.render(self.screen)
@@ -332,7 +731,9 @@ class GameController(object):
 
 
 if __name__ == "__main__":
-    game = GameController()
+    seed = None # Set to an integer, together with fixedTimestep, to make runs reproducible
+    headless = False # e.g. True for training workers, simulates without importing pygame, so nothing is drawn and there is no keyboard
+    game = GameController(seed, headless)
     speedModifier = 3 # Speed modifier to accelerate the speed of the enities
     game.speedModifier = speedModifier
     
@@ -340,8 +741,53 @@ if __name__ == "__main__":
     runUntilWin = False
     learnAndUsePolicy = True
     episodes = 50
+    renderInterval = 1 # Draw every Nth frame, 0 to never draw, anything but 1 simulates as fast as possible
+    renderFPS = None # Or draw at a target wall-clock FPS, e.g. 10, while simulating every frame as fast as possible
+    fixedTimestep = None # e.g. 1/30, simulates with a fixed dt as fast as possible instead of at 30 FPS
+    eventDriven = False # Jump each frame straight to the next event, for headless runs with renderInterval 0
+    substepDistance = None # e.g. TILEWIDTH / 2, simulates frames in steps no entity moves further in, for high speedModifiers
+    preloading = True # Build the next maze's nodes and pellets in a thread during the pause after a level is cleared
+    snapshotName = None # e.g. "pacman", then watch the game from another process with "python viewer.py pacman"
+    profile = False # Print per-phase frame times on exit, or on SIGUSR1
+    logHitches = False # Log frames taking longer than 1/30 s to hitches.log
+    replayFile = None # e.g. "replays/run.rpl", records the game, re-simulate it with "python replay.py replays/run.rpl"
+    transitionDir = None # e.g. "transitions", logs learned transitions, train on them with "python transitions.py transitions out.pkl"
+    experienceReplay = False # Learn from batches of past transitions instead of one update per transition
+    traceDecay = 0 # e.g. 0.9, learns with Watkins Q(lambda) so death and level rewards spread back along the path
+    qCapacity = None # e.g. 500000, most entries the Q-table keeps, evicting rarely visited ones
+    qMemoryLimit = None # e.g. 256 * 2**20, bytes the Q-table may take up
+    frozenPolicy = None # e.g. "policies/policy2.npz", plays greedily from a policy frozen with "python policytool.py freeze", when not learning
+    dyna = False # Replay modelled transitions as extra Q-updates, after every step and between episodes
+    linearAgent = False # Learn a linear Q-function over maze features, saved to policies/linear.npy, instead of the Q-table
     game.setLearning(learning)
     game.setRunUntilWin(runUntilWin)
+    game.setRenderInterval(renderInterval)
+    game.setRenderFPS(renderFPS)
+    game.setFixedTimestep(fixedTimestep)
+    game.setEventDriven(eventDriven)
+    game.setSubstepping(substepDistance)
+    game.setPreloading(preloading)
+    if snapshotName is not None:
+        game.publishSnapshots(snapshotName)
+    if profile:
+        game.enableProfiling()
+    if logHitches:
+        game.enableHitchLog()
+    if replayFile is not None:
+        game.recordReplay(replayFile)
+    if transitionDir is not None:
+        game.logTransitions(transitionDir)
+    game.setTraceDecay(traceDecay)
+    game.setQTableLimit(qCapacity, qMemoryLimit)
+    if dyna:
+        game.enableDyna()
+    if experienceReplay:
+        game.enableExperienceReplay()
+    if linearAgent:
+        game.setAgent(LinearAgent(), "policies/linear.npy")
+
+    if frozenPolicy is not None and not learning:
+        game.loadFrozenPolicy(frozenPolicy)
 
     if not learning: game.setEpsilon(0.0) # If we're not learning, set the exploration parameter to 0, so we only use actions based on the learned q-values
     game.startGame()
@@ -350,9 +796,9 @@ if __name__ == "__main__":
     if learning:
         game.setEpisodes(episodes)
         if learnAndUsePolicy: # If we are learning based on a previously learned policy
-            game.pacman.load_policy("policies/policy2.pkl")
-    else:
-        game.pacman.load_policy("policies/policy2.pkl")
+            game.pacman.load_policy(game.policyFile)
+    elif frozenPolicy is None:
+        game.pacman.load_policy(game.policyFile)
 
     while True:
         game.update()
@@ -0,0 +1,66 @@
+import heapq
+import itertools
+
+class Timer(object):
+    """
+    A function a Scheduler calls at time, see Scheduler.schedule
+    """
+    def __init__(self, time, func):
+        self.time = time
+        self.func = func
+        self.cancelled = False
+
+
+class Scheduler(object):
+    """
+    Calls functions when its clock, advanced by the dt of every frame, reaches their deadlines
+
+    The timers wait in a heap ordered by deadline, so a frame only costs the timers that run out
+    in it. Timers run out in deadline order, those with the same deadline in the order they were
+    scheduled, and while a timer's function runs the clock reads the deadline, so a timer that
+    schedules itself again keeps an exact period whatever the frame lengths are.
+    """
+    def __init__(self):
+        self.time = 0
+        self.queue = [] # (deadline, order scheduled, timer)
+        self.order = itertools.count()
+        self.tolerance = 1e-9 # Deadlines this close count as reached, so summing up dts does not lose a frame to rounding
+
+    def schedule(self, delay, func):
+        """
+        Calls func after delay seconds of this clock, returns the Timer to cancel it with
+        """
+        timer = Timer(self.time + delay, func)
+        heapq.heappush(self.queue, (timer.time, next(self.order), timer))
+        return timer
+
+    def cancel(self, timer):
+        # Cancelled timers stay in the heap until they come up, which keeps cancelling O(1)
+        if timer is not None:
+            timer.cancelled = True
+
+    def remaining(self, timer):
+        return timer.time - self.time
+
+    def timeToNext(self):
+        """
+        Returns the time until the next timer runs out, or None if none is waiting
+        """
+        queue = self.queue
+        while queue and queue[0][2].cancelled:
+            heapq.heappop(queue)
+        if not queue:
+            return None
+        return queue[0][0] - self.time
+
+    def advance(self, dt):
+        end = self.time + dt
+        queue = self.queue
+        while queue and queue[0][0] <= end + self.tolerance:
+            deadline, order, timer = heapq.heappop(queue)
+            if timer.cancelled:
+                continue
+            timer.cancelled = True # Done, so cancelling it later does nothing
+            self.time = max(self.time, deadline)
+            timer.func()
+        self.time = end
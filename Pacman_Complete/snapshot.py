@@ -0,0 +1,107 @@
+import atexit
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+from constants import *
+
+# Layout of one snapshot of the simulation, shared between the simulation and viewer processes
+ENTITY = np.dtype([("x", np.float32), ("y", np.float32), ("direction", np.int8), ("visible", np.uint8)])
+PACMAN_STATE = np.dtype([("entity", ENTITY), ("alive", np.uint8)])
+GHOST_STATE = np.dtype([("entity", ENTITY), ("name", np.int8), ("mode", np.int8)])
+FRUIT_STATE = np.dtype([("x", np.float32), ("y", np.float32), ("present", np.uint8)])
+SNAPSHOT = np.dtype([
+    ("seq", np.uint64), # Odd while the writer is in the middle of publishing
+    ("level", np.int32),
+    ("score", np.int32),
+    ("lives", np.int32),
+    ("flash", np.uint8), # Whether the flashing background is showing
+    ("pacman", PACMAN_STATE),
+    ("ghosts", GHOST_STATE, (4,)),
+    ("fruit", FRUIT_STATE),
+    ("pellets", np.uint8, (NROWS*NCOLS,)), # Alive mask indexed by pellet tile, row*NCOLS + col
+])
+
+def pelletTile(pellet):
+    return int(pellet.position.y / TILEHEIGHT) * NCOLS + int(pellet.position.x / TILEWIDTH)
+
+
+class SnapshotWriter(object):
+    def __init__(self, name=None):
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=SNAPSHOT.itemsize)
+        self.name = self.shm.name
+        self.data = np.ndarray((), dtype=SNAPSHOT, buffer=self.shm.buf)
+        self.data[...] = np.zeros((), dtype=SNAPSHOT)
+        self.pelletCount = None
+        self.pelletGroup = None
+        atexit.register(self.close)
+
+    def publish(self, game):
+        """
+        Copies the current state of the game into shared memory
+        """
+        data = self.data
+        data["seq"] += 1
+        data["level"] = game.level
+        data["score"] = game.score
+        data["lives"] = game.lives
+        data["flash"] = game.flashShown
+        self.writeEntity(data["pacman"]["entity"], game.pacman)
+        data["pacman"]["alive"] = game.pacman.alive
+        for i, ghost in enumerate(game.ghosts):
+            self.writeEntity(data["ghosts"][i]["entity"], ghost)
+            data["ghosts"][i]["name"] = ghost.name
+            data["ghosts"][i]["mode"] = ghost.mode.current
+        if game.fruit is not None:
+            data["fruit"]["x"] = game.fruit.position.x
+            data["fruit"]["y"] = game.fruit.position.y
+            data["fruit"]["present"] = 1
+        else:
+            data["fruit"]["present"] = 0
+        # The pellet mask only changes when a pellet is eaten or a new level is built
+        if game.pellets is not self.pelletGroup or len(game.pellets.pelletList) != self.pelletCount:
+            self.writePellets(data["pellets"], game.pellets)
+        data["seq"] += 1
+
+    def writeEntity(self, data, entity):
+        data["x"] = entity.position.x
+        data["y"] = entity.position.y
+        data["direction"] = entity.direction
+        data["visible"] = entity.visible
+
+    def writePellets(self, mask, pellets):
+        mask[...] = 0
+        for pellet in pellets.pelletList:
+            mask[pelletTile(pellet)] = 1
+        self.pelletGroup = pellets
+        self.pelletCount = len(pellets.pelletList)
+
+    def close(self):
+        if self.shm is not None:
+            self.data = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class SnapshotReader(object):
+    def __init__(self, name):
+        self.shm = shared_memory.SharedMemory(name=name)
+        # Attaching registers the segment with this process' resource tracker, which would unlink it on exit
+        resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.data = np.ndarray((), dtype=SNAPSHOT, buffer=self.shm.buf)
+
+    def read(self):
+        """
+        Returns a consistent copy of the latest snapshot, or None if nothing has been published yet
+        """
+        while True:
+            seq = int(self.data["seq"])
+            if seq == 0:
+                return None
+            if seq % 2 == 0:
+                snapshot = self.data.copy()
+                if int(self.data["seq"]) == seq:
+                    return snapshot
+
+    def close(self):
+        self.data = None
+        self.shm.close()
@@ -0,0 +1,106 @@
+from constants import *
+
+# Pacman's states are packed into one integer, from the lowest bits up:
+#   maze       2 bits, the maze index + 1, so no state is 0, which marks the terminal state
+#   pacman     8 bits, id of Pacman's node
+#   pellet    10 bits, tile index row * NCOLS + col of the closest pellet
+#   ghosts  4x 8 bits, node ids of Blinky, Pinky, Inky and Clyde
+#   modes   4x 2 bits, the ghosts' modes in the same order
+# That is 60 bits, so states fit in a signed 64-bit integer and go straight into NumPy arrays.
+MAZEBITS = 2
+NODEBITS = 8 # NodeGroup gives out fewer than 256 node ids per maze
+TILEBITS = 10
+MODEBITS = 2
+GHOSTS = [BLINKY, PINKY, INKY, CLYDE]
+PACMANSHIFT = MAZEBITS
+PELLETSHIFT = PACMANSHIFT + NODEBITS
+GHOSTSHIFT = PELLETSHIFT + TILEBITS
+MODESHIFT = GHOSTSHIFT + len(GHOSTS) * NODEBITS
+
+def tileIndex(x, y):
+    return int(y // TILEHEIGHT) * NCOLS + int(x // TILEWIDTH)
+
+def encodeState(maze, pacman, pellet, ghosts, modes):
+    """
+    Packs the maze index, Pacman's node id, the closest pellet's tile index and the ghosts' node ids and modes
+    """
+    state = (maze + 1) | (pacman << PACMANSHIFT) | (pellet << PELLETSHIFT)
+    for i in range(len(GHOSTS)):
+        state |= (ghosts[i] << (GHOSTSHIFT + i * NODEBITS)) | (modes[i] << (MODESHIFT + i * MODEBITS))
+    return state
+
+def decodeState(state):
+    """
+    Returns (maze, pacman, pellet, ghosts, modes) of a packed state
+    """
+    nodeMask = (1 << NODEBITS) - 1
+    modeMask = (1 << MODEBITS) - 1
+    maze = (state & ((1 << MAZEBITS) - 1)) - 1
+    pacman = (state >> PACMANSHIFT) & nodeMask
+    pellet = (state >> PELLETSHIFT) & ((1 << TILEBITS) - 1)
+    ghosts = tuple((state >> (GHOSTSHIFT + i * NODEBITS)) & nodeMask for i in range(len(GHOSTS)))
+    modes = tuple((state >> (MODESHIFT + i * MODEBITS)) & modeMask for i in range(len(GHOSTS)))
+    return maze, pacman, pellet, ghosts, modes
+
+
+class LegacyStates(object):
+    """
+    Converts the tuple states of Q-tables saved before states were packed into integers
+
+    A tuple state holds pixel positions but not the maze, so it is matched against the nodes of
+    every maze, and belongs to each maze in which all of its positions are nodes.
+    """
+    def __init__(self):
+        from mazedata import MazeData
+        from nodes import NodeGroup
+        self.mazes = []
+        mazedata = MazeData()
+        for level in range(len(mazedata.mazedict)):
+            mazedata.loadMaze(level)
+            nodes = NodeGroup(mazedata.obj.name+".txt")
+            mazedata.obj.setPortalPairs(nodes)
+            mazedata.obj.connectHomeNodes(nodes)
+            self.mazes.append(dict((key, node.id) for key, node in nodes.nodesLUT.items()))
+
+    def convert(self, state):
+        """
+        Returns the packed states of a tuple state, one per maze it fits
+        """
+        pacman, modes, pellet, blinky, pinky, inky, clyde = state
+        pelletTile = tileIndex(*pellet)
+        states = []
+        for maze, ids in enumerate(self.mazes):
+            positions = [pacman, blinky, pinky, inky, clyde]
+            if all(position in ids for position in positions):
+                nodes = [ids[position] for position in positions]
+                states.append(encodeState(maze, nodes[0], pelletTile, nodes[1:], modes))
+        return states
+
+    def convertTable(self, table):
+        """
+        Returns a copy of a dict keyed by (state, action) with the tuple states packed, entries that fit no maze are dropped
+        """
+        converted = {}
+        cache = {}
+        for (state, action), value in table.items():
+            if not isinstance(state, tuple):
+                converted[(state, action)] = value
+                continue
+            if state not in cache:
+                cache[state] = self.convert(state)
+            for packed in cache[state]:
+                converted[(packed, action)] = value
+        return converted
+
+def isLegacyTable(table):
+    for state, action in table:
+        return isinstance(state, tuple)
+    return False
+
+def convertLegacyTable(table):
+    """
+    Returns table with its tuple states packed into integers, or table itself if it has none
+    """
+    if not isLegacyTable(table):
+        return table
+    return LegacyStates().convertTable(table)
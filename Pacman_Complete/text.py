@@ -1,4 +1,3 @@
-import pygame
 from vector import Vector2
 from constants import *
 
@@ -10,47 +9,46 @@ class Text(object):
         self.size = size
         self.visible = visible
         self.position = Vector2(x, y)
-        self.timer = 0
         self.lifespan = time
+        # The font and label are only made when the text is first drawn, so games that never render need no pygame
+        self.font = None
         self.label = None
-        self.destroy = False
-        self.setupFont("PressStart2P-Regular.ttf")
-        self.createLabel()
 
     def setupFont(self, fontpath):
+        import pygame
         self.font = pygame.font.Font(fontpath, self.size)
 
     def createLabel(self):
+        if self.font is None:
+            self.setupFont("PressStart2P-Regular.ttf")
         self.label = self.font.render(self.text, 1, self.color)
 
     def setText(self, newtext):
         self.text = str(newtext)
-        self.createLabel()
-
-    def update(self, dt):
-        if self.lifespan is not None:
-            self.timer += dt
-            if self.timer >= self.lifespan:
-                self.timer = 0
-                self.lifespan = None
-                self.destroy = True
+        self.label = None
 
     def render(self, screen):
         if self.visible:
+            if self.label is None:
+                self.createLabel()
             x, y = self.position.asTuple()
             screen.blit(self.label, (x, y))
 
 
 class TextGroup(object):
-    def __init__(self):
+    def __init__(self, timers=None):
         self.nextid = 10
         self.alltext = {}
+        self.timers = timers # Removes texts when their time is up, they stay without
         self.setupText()
         self.showText(READYTXT)
 
     def addText(self, text, color, x, y, size, time=None, id=None):
         self.nextid += 1
         self.alltext[self.nextid] = Text(text, color, x, y, size, time=time, id=id)
+        if time is not None and self.timers is not None:
+            textid = self.nextid
+            self.timers.schedule(time, lambda: self.removeText(textid))
         return self.nextid
 
     def removeText(self, id):
@@ -66,12 +64,6 @@ class TextGroup(object):
         self.addText("SCORE", WHITE, 0, 0, size)
         self.addText("LEVEL", WHITE, 23*TILEWIDTH, 0, size)
 
-    def update(self, dt):
-        for tkey in list(self.alltext.keys()):
-            self.alltext[tkey].update(dt)
-            if self.alltext[tkey].destroy:
-                self.removeText(tkey)
-
     def showText(self, id):
         self.hideText()
         self.alltext[id].visible = True
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+class EligibilityTraces(object):
+    """
+    Sparse replacing eligibility traces of (state, action) pairs for Watkins Q(lambda)
+
+    Traces are stored divided by a common scale, so decaying all of them only multiplies the scale.
+    The pairs are kept in the order they were last visited, which is also the order of their traces,
+    so the traces that decayed below threshold, or the oldest ones past maxSize, are popped off the front.
+    """
+    def __init__(self, maxSize=10000, threshold=1e-3):
+        self.maxSize = maxSize
+        self.threshold = threshold
+        self.traces = OrderedDict()
+        self.scale = 1.0
+
+    def __len__(self):
+        return len(self.traces)
+
+    def visit(self, key):
+        """
+        Sets the trace of key to 1
+        """
+        self.traces[key] = 1.0 / self.scale
+        self.traces.move_to_end(key)
+        if len(self.traces) > self.maxSize:
+            self.traces.popitem(last=False)
+
+    def decay(self, factor):
+        self.scale *= factor
+        limit = self.threshold / self.scale if self.scale > 0 else float("inf")
+        while len(self.traces) > 0 and next(iter(self.traces.values())) < limit:
+            self.traces.popitem(last=False)
+        if len(self.traces) == 0:
+            self.scale = 1.0
+        elif self.scale < 1e-6:
+            # Fold the scale into the traces before the stored values grow too large
+            for key in self.traces:
+                self.traces[key] *= self.scale
+            self.scale = 1.0
+
+    def apply(self, q_table, step):
+        """
+        Adds step times its trace to the Q-value of every traced pair
+        """
+        step *= self.scale
+        for key, trace in self.traces.items():
+            q_table[key] = q_table.get(key, 0) + step * trace
+
+    def clear(self):
+        self.traces.clear()
+        self.scale = 1.0
@@ -0,0 +1,135 @@
+import os
+import glob
+import atexit
+import pickle
+import argparse
+import numpy as np
+from constants import *
+from qtable import ACTIONS, ArrayQTable, actionMask, actionColumns
+from states import convertLegacyTable
+
+class TransitionLogger(object):
+    """
+    Writes (state, action, reward, next_state, done) transitions to chunked NumPy files in a directory
+
+    The valid actions of the next state are logged as a bitmask as well, so offline updates take
+    the max over the same actions as Pacman.learn does.
+    """
+    def __init__(self, directory, chunkSize=100000):
+        self.directory = directory
+        self.chunkSize = chunkSize
+        os.makedirs(directory, exist_ok=True)
+        self.chunk = len(chunkFiles(directory))
+        self.states = np.zeros(chunkSize, dtype=np.int64) # Packed states, see states.py, terminal states are 0
+        self.actions = np.zeros(chunkSize, dtype=np.int8)
+        self.rewards = np.zeros(chunkSize, dtype=np.float32)
+        self.nextStates = np.zeros(chunkSize, dtype=np.int64)
+        self.dones = np.zeros(chunkSize, dtype=np.bool_)
+        self.nextActions = np.zeros(chunkSize, dtype=np.uint8)
+        self.count = 0
+        atexit.register(self.close)
+
+    def record(self, state, action, reward, nextState, nextActions):
+        if action not in ACTIONS:
+            return # Pacman was standing still, there is no column for it
+        i = self.count
+        self.states[i] = state
+        self.nextStates[i] = nextState
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = not nextState
+        self.nextActions[i] = actionMask(nextActions)
+        self.count += 1
+        if self.count == self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        if self.count == 0:
+            return
+        n = self.count
+        path = os.path.join(self.directory, "transitions_%06d.npz" % self.chunk)
+        np.savez(path, states=self.states[:n], actions=self.actions[:n], rewards=self.rewards[:n],
+                 nextStates=self.nextStates[:n], dones=self.dones[:n], nextActions=self.nextActions[:n])
+        self.chunk += 1
+        self.count = 0
+
+    def close(self):
+        self.flush()
+
+
+def chunkFiles(directory):
+    return sorted(glob.glob(os.path.join(directory, "transitions_*.npz")))
+
+def iterChunks(directory):
+    for path in chunkFiles(directory):
+        with np.load(path) as data:
+            yield dict((key, data[key]) for key in data.files)
+
+
+class OfflineTrainer(ArrayQTable):
+    """
+    Tabular Q-learning over logged transitions, without running the game
+
+    Each mini-batch is applied as one synchronous update of the array-backed Q-table.
+    """
+    def __init__(self, alpha=0.5, gamma=1):
+        ArrayQTable.__init__(self)
+        self.alpha = alpha
+        self.gamma = gamma
+
+    def stateIds(self, states):
+        """
+        Returns the ids of an array of packed states, adding the states not seen before
+        """
+        if states.ndim != 1:
+            raise ValueError("transitions logged before states were packed into integers cannot be replayed")
+        unique, inverse = np.unique(states, return_inverse=True)
+        uniqueIds = np.array([self.stateId(int(state)) for state in unique], dtype=np.int64)
+        return uniqueIds[inverse.reshape(-1)]
+
+    def train(self, directory, epochs=1, batchSize=4096):
+        """
+        Runs epochs passes over every chunk in directory and returns the number of transitions replayed
+        """
+        replayed = 0
+        for epoch in range(epochs):
+            for chunk in iterChunks(directory):
+                # Logs written before standing still was left out can hold STOP, which has no column
+                keep = np.isin(chunk["actions"], ACTIONS)
+                if not keep.all():
+                    chunk = dict((key, values[keep]) for key, values in chunk.items())
+                s = self.stateIds(chunk["states"])
+                s2 = self.stateIds(chunk["nextStates"])
+                a = actionColumns(chunk["actions"])
+                for start in range(0, len(s), batchSize):
+                    end = start + batchSize
+                    self.update(s[start:end], a[start:end], chunk["rewards"][start:end].astype(np.float64),
+                                s2[start:end], chunk["dones"][start:end], chunk["nextActions"][start:end],
+                                self.alpha, self.gamma)
+                replayed += len(s)
+        return replayed
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Trains a Q-table offline from transitions logged with GameController.logTransitions")
+    parser.add_argument("directory", help="directory holding the transitions_*.npz chunks")
+    parser.add_argument("output", help="policy file to write")
+    parser.add_argument("--policy", help="policy file to start from")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=4096, help="transitions per synchronous update")
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--gamma", type=float, default=1)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parseArgs()
+    trainer = OfflineTrainer(args.alpha, args.gamma)
+    if args.policy is not None:
+        with open(args.policy, "rb") as f:
+            trainer.loadPolicy(convertLegacyTable(pickle.load(f)))
+    replayed = trainer.train(args.directory, args.epochs, args.batch)
+    q_table = trainer.toPolicy()
+    with open(args.output, "wb") as f:
+        pickle.dump(q_table, f)
+    print("REPLAYED: ", replayed, "STATES: ", len(trainer.states), "ENTRIES: ", len(q_table))
@@ -0,0 +1,162 @@
+import sys
+import pygame
+from pygame.locals import *
+from constants import *
+from vector import Vector2
+from mazedata import MazeData
+from pellets import PelletGroup
+from text import TextGroup
+from scheduler import Scheduler
+from sprites import MazeSprites, LifeSprites, PacmanSprites, GhostSprites, FruitSprites
+from snapshot import SnapshotReader, pelletTile
+
+class ModeView(object):
+    def __init__(self):
+        self.current = SCATTER
+
+
+class EntityView(object):
+    """
+    Stand-in for an entity of the simulation, holding only what the sprite classes need
+    """
+    def __init__(self, name):
+        self.name = name
+        self.position = Vector2()
+        self.direction = STOP
+        self.visible = True
+        self.alive = True
+        self.mode = ModeView()
+        self.image = None
+        self.sprites = None
+
+    def setState(self, data):
+        self.position = Vector2(float(data["x"]), float(data["y"]))
+        self.direction = int(data["direction"])
+        self.visible = bool(data["visible"])
+
+    def render(self, screen):
+        if self.visible and self.image is not None:
+            adjust = Vector2(TILEWIDTH, TILEHEIGHT) / 2
+            p = self.position - adjust
+            screen.blit(self.image, p.asTuple())
+
+
+class Viewer(object):
+    """
+    Renders the latest snapshot published by a simulation process, see GameController.publishSnapshots
+    """
+    def __init__(self, name):
+        pygame.init()
+        self.screen = pygame.display.set_mode(SCREENSIZE, 0, 32)
+        pygame.display.set_caption(name)
+        self.clock = pygame.time.Clock()
+        self.timers = Scheduler() # Flashes the power pellets
+        self.reader = SnapshotReader(name)
+        self.mazedata = MazeData()
+        self.textgroup = TextGroup()
+        self.textgroup.hideText()
+        self.lifesprites = LifeSprites(0)
+        self.level = None
+        self.lives = None
+        self.score = None
+        self.pellets = None
+        self.pelletMask = None
+        self.background = None
+        self.pacman = EntityView(PACMAN)
+        self.pacman.sprites = PacmanSprites(self.pacman)
+        self.ghosts = []
+        for name in [BLINKY, PINKY, INKY, CLYDE]:
+            ghost = EntityView(name)
+            ghost.sprites = GhostSprites(ghost)
+            self.ghosts.append(ghost)
+        self.fruit = None
+
+    def loadLevel(self, level):
+        self.mazedata.loadMaze(level)
+        name = self.mazedata.obj.name
+        self.mazesprites = MazeSprites(name+".txt", name+"_rotation.txt")
+        self.background_norm = pygame.surface.Surface(SCREENSIZE).convert()
+        self.background_norm.fill(BLACK)
+        self.background_flash = pygame.surface.Surface(SCREENSIZE).convert()
+        self.background_flash.fill(BLACK)
+        self.background_norm = self.mazesprites.constructBackground(self.background_norm, level%5)
+        self.background_flash = self.mazesprites.constructBackground(self.background_flash, 5)
+        if self.pellets is not None:
+            self.pellets.stopTimers()
+        self.pellets = PelletGroup(name+".txt", self.timers)
+        self.fruit = None
+        self.textgroup.updateLevel(level)
+        self.level = level
+
+    def update(self):
+        dt = self.clock.tick(30) / 1000.0
+        snapshot = self.reader.read()
+        if snapshot is not None:
+            self.applySnapshot(snapshot, dt)
+            self.render()
+        self.checkEvents()
+
+    def applySnapshot(self, snapshot, dt):
+        if snapshot["level"] != self.level:
+            self.loadLevel(int(snapshot["level"]))
+        if snapshot["score"] != self.score:
+            self.score = int(snapshot["score"])
+            self.textgroup.updateScore(self.score)
+        if snapshot["lives"] != self.lives:
+            self.lives = int(snapshot["lives"])
+            self.lifesprites.resetLives(self.lives)
+        if snapshot["flash"]:
+            self.background = self.background_flash
+        else:
+            self.background = self.background_norm
+        self.pelletMask = snapshot["pellets"]
+        self.timers.advance(dt)
+
+        self.pacman.setState(snapshot["pacman"]["entity"])
+        self.pacman.alive = bool(snapshot["pacman"]["alive"])
+        self.pacman.sprites.update(dt)
+        for ghost, data in zip(self.ghosts, snapshot["ghosts"]):
+            ghost.setState(data["entity"])
+            ghost.mode.current = int(data["mode"])
+            ghost.sprites.update(dt)
+
+        fruit = snapshot["fruit"]
+        if fruit["present"]:
+            if self.fruit is None:
+                self.fruit = EntityView(FRUIT)
+                self.fruit.sprites = FruitSprites(self.fruit, self.level)
+            self.fruit.position = Vector2(float(fruit["x"]), float(fruit["y"]))
+        else:
+            self.fruit = None
+
+    def checkEvents(self):
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                self.reader.close()
+                exit()
+
+    def render(self):
+        self.screen.blit(self.background, (0, 0))
+        for pellet in self.pellets.pelletList:
+            if self.pelletMask[pelletTile(pellet)]:
+                pellet.render(self.screen)
+        if self.fruit is not None:
+            self.fruit.render(self.screen)
+        self.pacman.render(self.screen)
+        for ghost in self.ghosts:
+            ghost.render(self.screen)
+        self.textgroup.render(self.screen)
+
+        for i in range(len(self.lifesprites.images)):
+            x = self.lifesprites.images[i].get_width() * i
+            y = SCREENHEIGHT - self.lifesprites.images[i].get_height()
+            self.screen.blit(self.lifesprites.images[i], (x, y))
+
+        pygame.display.update()
+
+
+if __name__ == "__main__":
+    # Attach to a running simulation, e.g. "python viewer.py pacman" for a game started with snapshotName = "pacman"
+    viewer = Viewer(sys.argv[1])
+    while True:
+        viewer.update()